@@ -2,48 +2,61 @@
 import os
 import re
 import sys
-import ctypes
+import time
+import codecs
 import struct
-import datetime
 import collections
 import configparser
 
+import numpy as np
+
 from PyQt5 import QtCore, QtGui, QtWidgets, uic
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, Qt
 from PyQt5.QtWidgets import QApplication, QWidget, QDialog, QFileDialog, QTableWidgetItem
-from PyQt5.QtChart import QChart, QChartView, QLineSeries
+from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis
 
-import jlink
-import xlink
+import rtt
+import capture
+import metrics
+import waveform
+from rtt import PollScheduler, RTTWorker
 
 
-os.environ['PATH'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libusb-1.0.24/MinGW64/dll') + os.pathsep + os.environ['PATH']
+Valuable = collections.namedtuple('Valuable', 'name addr size typ fmt show')    # variable to read and display
 
+zero_if = lambda i: 0 if i == -1 else i
 
-class RingBuffer(ctypes.Structure):
-    _fields_ = [
-        ('sName',        ctypes.c_uint),    # ctypes.POINTER(ctypes.c_char)，64位Python中 ctypes.POINTER 是64位的，与目标芯片不符
-        ('pBuffer',      ctypes.c_uint),    # ctypes.POINTER(ctypes.c_byte)
-        ('SizeOfBuffer', ctypes.c_uint),
-        ('WrOff',        ctypes.c_uint),    # Position of next item to be written. 对于aUp：   芯片更新WrOff，主机更新RdOff
-        ('RdOff',        ctypes.c_uint),    # Position of next item to be read.    对于aDown： 主机更新WrOff，芯片更新RdOff
-        ('Flags',        ctypes.c_uint),
-    ]
 
-class SEGGER_RTT_CB(ctypes.Structure):      # Control Block
-    _fields_ = [
-        ('acID',              ctypes.c_char * 16),
-        ('MaxNumUpBuffers',   ctypes.c_uint),
-        ('MaxNumDownBuffers', ctypes.c_uint),
-        ('aUp',               RingBuffer * 2),
-        ('aDown',             RingBuffer * 2),
-    ]
+ENCODINGS = {'ASCII': 'latin-1', 'Shift-JIS': 'shift_jis', 'UTF-16': 'utf-16-le'}   # cmbICode text to Python codec name, if not the same; target is little-endian
 
+codecs.register_error('rawbyte', lambda e: (e.object[e.start:e.end].decode('latin-1'), e.end))  # 无法解码的字节按单字节字符显示
 
-Variable = collections.namedtuple('Variable', 'name addr size')                 # variable from *.elf file
-Valuable = collections.namedtuple('Valuable', 'name addr size typ fmt show')    # variable to read and display
 
-zero_if = lambda i: 0 if i == -1 else i
+def polygon_array(polygon):
+    ''' (size, 2) numpy view of QPolygonF's points, column 0 is x, column 1 is y '''
+    ptr = polygon.data()    # detach from series holding the same data, so series is changed only by replace()
+    ptr.setsize(polygon.size() * 2 * 8)
+    return np.frombuffer(ptr, np.float64).reshape(-1, 2)
+
+
+HEX_ASCII = bytes(x if 0x20 <= x < 0x7F else 0x2E for x in range(256))    # 不可显示的字节在 ASCII 列显示为 .
+
+
+def hexdump(data, offset=0, width=16):
+    ''' rows of "offset  hex bytes  |ascii|", data continue from offset, so a row can start in the middle '''
+    hexs = data.hex(' ').upper()    # 每字节 3 个字符
+    text = data.translate(HEX_ASCII).decode('latin-1')
+
+    rows = []
+    pos = 0
+    while pos < len(data):
+        col = (offset + pos) % width
+        n = min(width - col, len(data) - pos)
+        rows.append(f'{offset + pos - col:08X}  ' + ('   ' * col + hexs[pos*3:(pos+n)*3-1]).ljust(width*3-1) + '  |' + (' ' * col + text[pos:pos+n]).ljust(width) + '|')
+        pos += n
+
+    return '\n'.join(rows) + '\n' if rows else ''
+
 
 '''
 from RTTView_UI import Ui_RTTView
@@ -68,10 +81,32 @@ class RTTView(QWidget):
 
         self.initQwtPlot()
 
-        self.rcvbuff = b''
-        self.rcvfile = None
+        self.rcvbuff = collections.defaultdict(bytes)  # {chnl: bytes}
+        self.txtMain.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))   # 等宽字体，HEX 显示各列对齐
+        self.rcvdocs = {}   # {chnl: QTextDocument}, each aUp channel has its own terminal
+        self.txtMain.setDocument(self.chnlDoc(0))   # 文档都由窗口持有，切换通道时 setDocument() 不会删除编辑器自带的文档
+        self.rcvtext = collections.defaultdict(list)    # {chnl: [str]}, text received, shown once every frame
+        self.rcvdecoders = {}                           # {chnl: (encoding, incremental decoder)}
+        self.rcvoffset = collections.defaultdict(int)   # {chnl: bytes received}, offset shown in HEX mode
+        self.capture = None     # capture.CaptureWriter when chkSave checked
+        self.replay = None      # capture.Replay standing in for probe when replaying capture file
 
         self.elffile = None
+
+        self.worker = None
+
+        self.waveDecoder = None # decoder of binary wave records, None in text format
+
+        self.metrics = metrics.Metrics()
+        self.metricsExport = None   # metrics.MetricsExport when [metrics] export is set
+
+        self.lblMetrics = QtWidgets.QLabel(self)    # 浮在窗口右上角，F12 显示/隐藏
+        self.lblMetrics.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.lblMetrics.setStyleSheet('background-color: rgba(0, 0, 0, 160); color: white; padding: 4px;')
+        self.lblMetrics.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.lblMetrics.setVisible(self.METRICS_OVERLAY)
+
+        QtWidgets.QShortcut(QtGui.QKeySequence(Qt.Key_F12), self, lambda: self.lblMetrics.setVisible(not self.lblMetrics.isVisible()))
         
         self.tmrRTT = QtCore.QTimer()
         self.tmrRTT.setInterval(10)
@@ -79,6 +114,16 @@ class RTTView(QWidget):
         self.tmrRTT.start()
 
         self.tmrRTT_Cnt = 0
+
+        self.tmrFrame = QtCore.QTimer() # 显示与数据接收分开，刷新频率不超过 fps
+        self.tmrFrame.setInterval(1000 // self.PLOT_FPS)
+        self.tmrFrame.timeout.connect(self.on_tmrFrame_timeout)
+        self.tmrFrame.start()
+
+        self.tmrMetrics = QtCore.QTimer()
+        self.tmrMetrics.setInterval(1000)
+        self.tmrMetrics.timeout.connect(self.on_tmrMetrics_timeout)
+        self.tmrMetrics.start()
     
     def initSetting(self):
         if not os.path.exists('setting.ini'):
@@ -101,6 +146,8 @@ class RTTView(QWidget):
 
         self.cmbDLL.addItem(self.conf.get('link', 'jlink'), 'jlink')
         self.cmbDLL.addItem('OpenOCD Tcl RPC (6666)', 'openocd')
+        self.cmbDLL.addItem('Capture file replay (*.rttcap)', 'replay')
+        self.cmbDLL.addItem('Simulated target', 'sim')
         self.daplink_detect()    # add DAPLink
 
         self.cmbDLL.setCurrentIndex(zero_if(self.cmbDLL.findText(self.conf.get('link', 'select'))))
@@ -118,41 +165,100 @@ class RTTView(QWidget):
             self.conf.add_section('display')
             self.conf.set('display', 'ncurve', '4')     # max curve number supported
             self.conf.set('display', 'npoint', '1000')
+            self.conf.set('display', 'fps', '30')       # max chart and text refresh rate
+            self.conf.set('display', 'maxline', '10000')    # lines kept in text view, oldest lines are dropped
 
             self.conf.add_section('history')
             self.conf.set('history', 'hist1', '11 22 33 AA BB CC')
 
+        if not self.conf.has_section('rtt'):
+            self.conf.add_section('rtt')
+            self.conf.set('rtt', 'hiwater', '50')       # aUp buffer fill level (%) to keep under
+            self.conf.set('rtt', 'interval_min', '0')   # poll interval range (ms)
+            self.conf.set('rtt', 'interval_max', '50')
+
+        if not self.conf.has_section('capture'):
+            self.conf.add_section('capture')
+            self.conf.set('capture', 'rotate_size', '0')    # MB, start a new capture file when file reaches this size, 0 for never
+            self.conf.set('capture', 'rotate_time', '0')    # hours, start a new capture file every this time, 0 for never
+            self.conf.set('capture', 'replay_speed', '1')   # 1: real time, N: N times faster, 0: as fast as possible
+            self.conf.set('capture', 'index', '1')          # 1: write search index next to capture file
+
+        if not self.conf.has_section('metrics'):
+            self.conf.add_section('metrics')
+            self.conf.set('metrics', 'overlay', '0')    # 1: show metrics over window when started, F12 to toggle
+            self.conf.set('metrics', 'export', '')      # append metrics as JSON lines to this file when connected, e.g. metrics_%y%m%d%H%M%S.jsonl
+            self.conf.set('metrics', 'interval', '1')   # seconds between JSON lines, at least 1
+
+        if not self.conf.has_section('wave'):
+            self.conf.add_section('wave')
+            self.conf.set('wave', 'format', 'text')     # text: "11 22, 33 44,"; or binary record layout in struct format, e.g. <hhf
+            self.conf.set('wave', 'sync', '')           # hex bytes before every binary record, e.g. 5AA5
+            self.conf.set('wave', 'crc', 'none')        # none, sum8, crc16, crc32 after every binary record
+
         self.cmbICode.setCurrentIndex(zero_if(self.cmbICode.findText(self.conf.get('encode', 'input'))))
         self.cmbOCode.setCurrentIndex(zero_if(self.cmbOCode.findText(self.conf.get('encode', 'output'))))
         self.cmbEnter.setCurrentIndex(zero_if(self.cmbEnter.findText(self.conf.get('encode', 'oenter'))))
 
         self.N_CURVE = int(self.conf.get('display', 'ncurve'), 10)
         self.N_POINT = int(self.conf.get('display', 'npoint'), 10)
+        self.PLOT_FPS = max(int(self.conf.get('display', 'fps', fallback='30'), 10), 1)
+        self.TEXT_MAXLINE = int(self.conf.get('display', 'maxline', fallback='10000'), 10)
+
+        self.REPLAY_SPEED = float(self.conf.get('capture', 'replay_speed', fallback='1'))
+
+        self.CAPTURE_ROTATE_SIZE = int(float(self.conf.get('capture', 'rotate_size')) * 1024 * 1024)
+        self.CAPTURE_ROTATE_TIME = float(self.conf.get('capture', 'rotate_time')) * 3600
+        self.CAPTURE_INDEX = self.conf.get('capture', 'index', fallback='1') == '1'
+
+        self.METRICS_OVERLAY = self.conf.get('metrics', 'overlay') == '1'
+        self.METRICS_EXPORT = self.conf.get('metrics', 'export').strip()
+        self.METRICS_INTERVAL = float(self.conf.get('metrics', 'interval'))
+
+        self.RTT_HIWATER = float(self.conf.get('rtt', 'hiwater')) / 100
+        self.RTT_INTERVAL_MIN = float(self.conf.get('rtt', 'interval_min')) / 1000
+        self.RTT_INTERVAL_MAX = float(self.conf.get('rtt', 'interval_max')) / 1000
+
+        self.WAVE_FORMAT = self.conf.get('wave', 'format').strip()
+        self.WAVE_SYNC = bytes.fromhex(self.conf.get('wave', 'sync'))
+        self.WAVE_CRC = self.conf.get('wave', 'crc').strip().lower()
 
         self.txtSend.setPlainText(self.conf.get('history', 'hist1'))
 
     def initQwtPlot(self):
-        self.PlotData  = [[0]*self.N_POINT for i in range(self.N_CURVE)]
-        self.PlotPoint = [[QtCore.QPointF(j, 0) for j in range(self.N_POINT)] for i in range(self.N_CURVE)]
+        self.PlotData  = waveform.SampleRing(self.N_CURVE, self.N_POINT)
+        self.PlotPoint = [QtGui.QPolygonF() for i in range(self.N_CURVE)]     # decimated points to draw
+        self.PlotDecim = waveform.Decimator()
+
+        self.PlotWidth = None   # fields in last record received, None: curves shown are set by variable table
+        self.PlotKey = None     # (data version, curves, width, visible range) of last drawing, nothing to draw if unchanged
 
         self.PlotChart = QChart()
 
         self.ChartView = QChartView(self.PlotChart)
+        self.ChartView.setRubberBand(QChartView.HorizontalRubberBand)  # 框选放大，右键缩小
         self.ChartView.setVisible(False)
         self.vLayout.insertWidget(0, self.ChartView)
+
+        self.PlotAxisX = QValueAxis()
+        self.PlotAxisY = QValueAxis()
+        self.PlotChart.addAxis(self.PlotAxisX, Qt.AlignBottom)
+        self.PlotChart.addAxis(self.PlotAxisY, Qt.AlignLeft)
+        self.PlotAxisX.setRange(0, self.N_POINT)
         
         self.PlotCurve = [QLineSeries() for i in range(self.N_CURVE)]
+        for curve in self.PlotCurve:    # 曲线始终在图中，通过显示/隐藏改变曲线数目，不必重建坐标轴
+            self.PlotChart.addSeries(curve)
+            curve.attachAxis(self.PlotAxisX)
+            curve.attachAxis(self.PlotAxisY)
+            curve.setVisible(False)
 
     def daplink_detect(self):
-        try:
-            from pyocd.probe import aggregator
-            self.daplinks = aggregator.DebugProbeAggregator.get_all_connected_probes()
-        except Exception as e:
-            self.daplinks = []
+        self.daplinks = rtt.daplink_detect()
 
-        if len(self.daplinks) != self.cmbDLL.count() - 2:
-            for i in range(2, self.cmbDLL.count()):
-                self.cmbDLL.removeItem(2)
+        if len(self.daplinks) != self.cmbDLL.count() - 4:
+            for i in range(4, self.cmbDLL.count()):
+                self.cmbDLL.removeItem(4)
 
             for i, daplink in enumerate(self.daplinks):
                 self.cmbDLL.addItem(f'{daplink.product_name} ({daplink.unique_id})', i)
@@ -162,81 +268,134 @@ class RTTView(QWidget):
         if self.btnOpen.text() == '打开连接':
             mode = self.cmbMode.currentText()
             mode = mode.replace(' SWD', '').replace(' cJTAG', '').replace(' JTAG', 'J').lower()
-            core = 'Cortex-M0' if mode.startswith('arm') else 'RISC-V'
             speed= int(self.cmbSpeed.currentText().split()[0]) * 1000 # KHz
+            self.xlk = None
+            self.replay = None
             try:
                 item_data = self.cmbDLL.currentData()
 
-                if item_data == 'jlink':
-                    self.xlk = xlink.XLink(jlink.JLink(self.cmbDLL.currentText(), mode, core, speed))
+                if item_data == 'replay':
+                    path, filter = QFileDialog.getOpenFileName(caption='capture file to replay', filter='RTT capture (*.rttcap)', directory=self.conf.get('history', 'replay', fallback=''))
+                    if path == '':
+                        return
+
+                    self.conf.set('history', 'replay', path)
+
+                    self.xlk = self.replay = capture.Replay(path, self.REPLAY_SPEED)    # 回放文件代替 XLink 和 RTT
+
+                elif item_data == 'jlink':
+                    self.xlk = rtt.open_xlink(self.cmbDLL.currentText(), mode, speed)
                 
                 elif item_data == 'openocd':
-                    import openocd
-                    self.xlk = xlink.XLink(openocd.OpenOCD(mode=mode, core=core, speed=speed))
+                    self.xlk = rtt.open_xlink('openocd', mode, speed)
+
+                elif item_data == 'sim':
+                    self.xlk = rtt.open_xlink('sim:' + self.conf.get('link', 'sim', fallback=''), mode, speed)     # e.g. sim = latency=0.001,rate=100000
                 
                 else:
-                    from pyocd.coresight import dap, ap, cortex_m
-                    daplink = self.daplinks[item_data]
-                    daplink.open()
+                    self.xlk = rtt.open_xlink(self.daplinks[item_data], mode, speed)
 
-                    _dp = dap.DebugPort(daplink, None)
-                    _dp.init()
-                    _dp.power_up_debug()
-                    _dp.set_clock(speed * 1000)
+                self.metrics = metrics.Metrics()
+                if not self.replay:
+                    self.xlk = metrics.TimedXLink(self.xlk, self.metrics)     # 统计每种探针的访问延时
+                
+                self.waveDecoder = None
 
-                    _ap = ap.AHB_AP(_dp, 0)
-                    _ap.init()
+                self.rcvoffset.clear()
 
-                    self.xlk = xlink.XLink(cortex_m.CortexM(None, _ap))
-                
-                if self.chkSave.isChecked():
-                    self.rcvfile = open(datetime.datetime.now().strftime("rcv_%y%m%d%H%M%S.txt"), 'w')
-
-                if re.match(r'0[xX][0-9a-fA-F]{8}', self.cmbAddr.currentText()):
-                    addr = int(self.cmbAddr.currentText(), 16)
-                    for i in range(64):
-                        data = self.xlk.read_mem_U8(addr + 1024 * i, 1024 + 32) # 多读32字节，防止搜索内容在边界处
-                        index = bytes(data).find(b'SEGGER RTT')
-                        if index != -1:
-                            self.RTTAddr = addr + 1024 * i + index
-
-                            data = self.xlk.read_mem_U8(self.RTTAddr, ctypes.sizeof(SEGGER_RTT_CB))
-
-                            rtt_cb = SEGGER_RTT_CB.from_buffer(bytearray(data))
-                            self.aUpAddr = self.RTTAddr + 16 + 4 + 4
-                            self.aDownAddr = self.aUpAddr + ctypes.sizeof(RingBuffer) * rtt_cb.MaxNumUpBuffers
-
-                            self.txtMain.append(f'\n_SEGGER_RTT @ 0x{self.RTTAddr:08X} with {rtt_cb.MaxNumUpBuffers} aUp and {rtt_cb.MaxNumDownBuffers} aDown\n')
-                            break
-                        
-                    else:
-                        raise Exception('Can not find _SEGGER_RTT')
+                if self.replay:
+                    self.rtt = self.replay
+
+                    self.txtMain.append(f'\nreplay {path} with {self.replay.aUpNum} aUp at ' + (f'{self.REPLAY_SPEED}x speed\n' if self.REPLAY_SPEED else 'full speed\n'))
+
+                    self.aUpNum = self.replay.aUpNum
+                    self.aDownNum = 0
+
+                    self.rtt_cb = False
+
+                    if self.WAVE_FORMAT != 'text':
+                        self.waveDecoder = waveform.FrameDecoder(self.WAVE_FORMAT, self.WAVE_SYNC, None if self.WAVE_CRC == 'none' else self.WAVE_CRC)
+
+                elif re.match(r'0[xX][0-9a-fA-F]{8}', self.cmbAddr.currentText()):
+                    sched = PollScheduler(self.RTT_HIWATER, self.RTT_INTERVAL_MIN, self.RTT_INTERVAL_MAX)
+
+                    self.rtt = rtt.RTT(self.xlk, sched)   # 地址栏是地址时没有 elf 文件，从该地址开始扫描 _SEGGER_RTT
+                    self.rtt.connect(int(self.cmbAddr.currentText(), 16))
+
+                    self.txtMain.append(f'\n_SEGGER_RTT @ 0x{self.rtt.RTTAddr:08X} with {self.rtt.aUpNum} aUp and {self.rtt.aDownNum} aDown\n')
+
+                    self.aUpNum = self.rtt.aUpNum
+                    self.aDownNum = self.rtt.aDownNum
 
                     self.rtt_cb = True
 
+                    if self.WAVE_FORMAT != 'text':
+                        self.waveDecoder = waveform.FrameDecoder(self.WAVE_FORMAT, self.WAVE_SYNC, None if self.WAVE_CRC == 'none' else self.WAVE_CRC)
+
                 else:
+                    self.aUpNum = 1
+                    self.aDownNum = 0
+
                     self.rtt_cb = False
 
+                self.cmbChnl.clear()
+                self.cmbChnl.addItems([f'Chnl {i}' for i in range(self.aUpNum)])
+
             except Exception as e:
                 self.txtMain.append(f'\nerror: {str(e)}\n')
 
                 try:
                     self.xlk.close()
                 except:
-                    try:
-                        daplink.close()
-                    except:
-                        pass
+                    pass
 
             else:
+                if self.chkSave.isChecked() and not self.replay:   # 原始数据连同时间戳由后台线程写入，可用 capture.py 导出；回放时数据已在文件中
+                    self.capture = capture.CaptureWriter('rcv_%y%m%d%H%M%S.rttcap', self.CAPTURE_ROTATE_SIZE, self.CAPTURE_ROTATE_TIME, self.CAPTURE_INDEX)
+
+                if self.replay:
+                    self.worker = RTTWorker(self.replay.aUpRead, self.replay.aDownWrite, None, 0.01 if self.REPLAY_SPEED else 0, backlog=16)
+                elif self.rtt_cb:
+                    self.worker = RTTWorker(self.rtt.aUpRead, self.rtt.aDownWrite, self.rtt.sched, capture=self.capture)
+                else:
+                    self.worker = RTTWorker(self.varRead, None, capture=self.capture)
+                self.worker.start()
+
+                if self.METRICS_EXPORT:
+                    self.metricsExport = metrics.MetricsExport(self.METRICS_EXPORT, self.METRICS_INTERVAL)
+
                 self.cmbDLL.setEnabled(False)
                 self.btnDLL.setEnabled(False)
                 self.cmbAddr.setEnabled(False)
                 self.btnOpen.setText('关闭连接')
 
         else:
-            if self.rcvfile and not self.rcvfile.closed:
-                self.rcvfile.close()
+            self.worker.stop()
+
+            if self.metricsExport:
+                self.metricsExport.write(self.metrics.snapshot(self.worker.counters()))
+
+            self.worker = None
+
+            if self.rtt_cb:
+                stats = self.rtt.sched.stats()
+                self.txtMain.append(f'\npoll interval {stats["interval"]*1000:.1f} ms, {stats["polls/s"]:.0f} polls/s, {stats["bytes/s"]:.0f} bytes/s, '
+                                    f'peak fill {stats["fill_peak"]:.0%}, {stats["overs"]} over high-water, {stats["speedups"]} speedups, {stats["backoffs"]} backoffs')
+
+                for chnl, stats in self.rtt.stats().items():
+                    if stats['size']:
+                        self.txtMain.append(f'Chnl {chnl}: {stats["size"]} bytes {stats["mode"]}, {stats["bytes"]} bytes read, high-water {stats["hiwater"]:.0%}, '
+                                            f'{stats["fulls"]} full, {stats["resets"]} reset, {stats["drops"]} polls lost data')
+                self.txtMain.append('')
+
+            if self.capture:
+                self.capture.close()
+                self.txtMain.append(f'saved to {", ".join(self.capture.paths)}\n')
+                self.capture = None
+
+            if self.metricsExport:
+                self.metricsExport.close()
+                self.metricsExport = None
 
             self.xlk.close()
 
@@ -245,196 +404,215 @@ class RTTView(QWidget):
             self.cmbAddr.setEnabled(True)
             self.btnOpen.setText('打开连接')
     
-    def aUpRead(self):
-        data = self.xlk.read_mem_U8(self.aUpAddr, ctypes.sizeof(RingBuffer))
+    def varRead(self):
+        vals = []
+        for name, addr, size, typ, fmt, show in list(self.Vals.values()):
+            if show:
+                buf = self.xlk.read_mem_U8(addr, size)
+                vals.append(struct.unpack(fmt, bytes(buf))[0])
+
+        return {0: b'\t'.join(f'{val}'.encode() for val in vals) + b',\n'}
+    
+    def on_tmrRTT_timeout(self):
+        self.tmrRTT_Cnt += 1
+        if self.btnOpen.text() == '关闭连接':
+            start = time.perf_counter()
 
-        aUp = RingBuffer.from_buffer(bytearray(data))
-        
-        if aUp.RdOff <= aUp.WrOff:
-            cnt = aUp.WrOff - aUp.RdOff
+            rcvd = self.worker.recv()
+            for chnl, rcvdbytes in rcvd.items():
+                if chnl >= self.cmbChnl.count():    # 回放文件中后出现的通道
+                    self.cmbChnl.addItems([f'Chnl {i}' for i in range(self.cmbChnl.count(), chnl + 1)])
+                    self.aUpNum = chnl + 1
 
-        else:
-            cnt = aUp.SizeOfBuffer - aUp.RdOff
+                if rcvdbytes:
+                    self.rcvbuff[chnl] += rcvdbytes
+                
+                    if self.chkWave.isChecked() and chnl == self.cmbChnl.currentIndex():
+                        try:
+                            if self.waveDecoder:
+                                d = self.waveDecoder.decode(self.rcvbuff[chnl])     # (records, fields) array
+                                self.rcvbuff[chnl] = b''
+                            else:
+                                d, self.rcvbuff[chnl] = waveform.parse_text(self.rcvbuff[chnl], self.cmbICode.currentText() == 'HEX')
 
-        if 0 < cnt < 1024*1024:
-            data = self.xlk.read_mem_U8(ctypes.cast(aUp.pBuffer, ctypes.c_void_p).value + aUp.RdOff, cnt)
+                            if len(d):
+                                self.PlotData.extend(d)
+                                self.PlotWidth = len(d[-1])
             
-            aUp.RdOff = (aUp.RdOff + cnt) % aUp.SizeOfBuffer
-            
-            self.xlk.write_U32(self.aUpAddr + 4*4, aUp.RdOff)
+                        except Exception as e:
+                            self.rcvbuff[chnl] = b''
+                            print(e)
+
+                    else:
+                        if self.cmbICode.currentText() == 'HEX':
+                            text = hexdump(self.rcvbuff[chnl], self.rcvoffset[chnl])
+                            self.rcvoffset[chnl] += len(self.rcvbuff[chnl])
+                            self.rcvbuff[chnl] = b''
+
+                        else:
+                            text = self.chnlDecoder(chnl).decode(self.rcvbuff[chnl])   # 不完整的多字节字符留在解码器中，下次接着解码
+                            self.rcvbuff[chnl] = b''
+                    
+                        if text:
+                            self.rcvtext[chnl].append(text)
+
+            if rcvd:
+                self.metrics.observe('decode', time.perf_counter() - start)
+
+            if self.replay and self.replay.done and not self.worker.rcvq and self.replay.elapsed:
+                self.txtMain.append(f'\nreplay done, {self.replay.bytes} bytes in {self.replay.elapsed:.2f} s, {self.replay.bytes / self.replay.elapsed / 1024:.0f} KB/s\n')
+                self.replay.elapsed = 0     # 只提示一次
+
+            if self.tmrRTT_Cnt % 100 == 0 and self.rtt_cb:   # 丢数据的通道在通道选择框中标出
+                for chnl, stat in enumerate(self.rtt.chnlStats):
+                    self.cmbChnl.setItemText(chnl, f'Chnl {chnl}' + (f' !{stat.drops}' if stat.drops else ''))
+
+            if self.tmrRTT_Cnt % 10 == 0:
+                prog = self.worker.progress()
+                sent, total = sum(x[0] for x in prog.values()), sum(x[1] for x in prog.values())
+                self.btnFile.setText(f'{sent * 100 // total}%' if total else '发送文件')
 
         else:
-            data = []
-        
-        return bytes(data)
+            if self.tmrRTT_Cnt % 100 == 1:
+                self.daplink_detect()
 
-    def aDownWrite(self, bytes):
-        data = self.xlk.read_mem_U8(self.aDownAddr, ctypes.sizeof(RingBuffer))
+            if self.tmrRTT_Cnt % 100 == 2:
+                path = self.cmbAddr.currentText()
+                if os.path.exists(path) and os.path.isfile(path):
+                    if self.elffile != (path, os.path.getmtime(path)):
+                        self.elffile = (path, os.path.getmtime(path))
 
-        aDown = RingBuffer.from_buffer(bytearray(data))
-        
-        if aDown.WrOff >= aDown.RdOff:
-            if aDown.RdOff != 0: cnt = min(aDown.SizeOfBuffer - aDown.WrOff, len(bytes))
-            else:                cnt = min(aDown.SizeOfBuffer - 1 - aDown.WrOff, len(bytes))   # 写入操作不能使得 aDown.WrOff == aDown.RdOff，以区分满和空
-            self.xlk.write_mem(ctypes.cast(aDown.pBuffer, ctypes.c_void_p).value + aDown.WrOff, bytes[:cnt])
-            
-            aDown.WrOff += cnt
-            if aDown.WrOff == aDown.SizeOfBuffer: aDown.WrOff = 0
+                        self.parse_elffile(path)
 
-            bytes = bytes[cnt:]
+    def on_tmrFrame_timeout(self):
+        start = time.perf_counter()
+        if self.textFlush():
+            self.metrics.observe('render.text', time.perf_counter() - start)
 
-        if bytes and aDown.RdOff != 0 and aDown.RdOff != 1:        # != 0 确保 aDown.WrOff 折返回 0，!= 1 确保有空间可写入
-            cnt = min(aDown.RdOff - 1 - aDown.WrOff, len(bytes))   # - 1 确保写入操作不导致WrOff与RdOff指向同一位置
-            self.xlk.write_mem(ctypes.cast(aDown.pBuffer, ctypes.c_void_p).value + aDown.WrOff, bytes[:cnt])
+        if self.ChartView.isVisible() and not self.isMinimized():  # 看不见时不绘图
+            start = time.perf_counter()
+            if self.plotRedraw():
+                self.metrics.observe('render.plot', time.perf_counter() - start)
 
-            aDown.WrOff += cnt
+    def on_tmrMetrics_timeout(self):
+        if self.worker is None or not (self.lblMetrics.isVisible() or self.metricsExport):
+            return
 
-        self.xlk.write_U32(self.aDownAddr + 4*3, aDown.WrOff)
-    
-    def on_tmrRTT_timeout(self):
-        self.tmrRTT_Cnt += 1
-        if self.btnOpen.text() == '关闭连接':
-            try:
-                if self.rtt_cb:
-                    rcvdbytes = self.aUpRead()
+        snap = self.metrics.snapshot(self.worker.counters())
 
-                else:
-                    vals = []
-                    for name, addr, size, typ, fmt, show in self.Vals.values():
-                        if show:
-                            buf = self.xlk.read_mem_U8(addr, size)
-                            vals.append(struct.unpack(fmt, bytes(buf))[0])
+        if self.lblMetrics.isVisible():
+            self.lblMetrics.setText(self.metrics.summary(snap))
+            self.lblMetrics.adjustSize()
+            self.lblMetrics.move(self.width() - self.lblMetrics.width() - 20, 10)
+            self.lblMetrics.raise_()
 
-                    rcvdbytes = b'\t'.join(f'{val}'.encode() for val in vals) + b',\n'
-            
-            except Exception as e:
-                rcvdbytes = b''
+        if self.metricsExport and self.metricsExport.due():
+            self.metricsExport.write(snap)
 
-            if rcvdbytes:
-                if self.rcvfile and not self.rcvfile.closed:
-                    self.rcvfile.write(rcvdbytes.decode('latin-1'))
+    def textFlush(self):
+        ''' insert text received since last frame, one insertion each channel, return True if any inserted '''
+        flushed = False
+        for chnl, texts in self.rcvtext.items():
+            if not texts:
+                continue
 
-                self.rcvbuff += rcvdbytes
-                
-                if self.chkWave.isChecked():
-                    if b',' in self.rcvbuff:
-                        try:
-                            d = self.rcvbuff[0:self.rcvbuff.rfind(b',')].split(b',')        # [b'12', b'34'] or [b'12 34', b'56 78']
-                            if self.cmbICode.currentText() != 'HEX':
-                                d = [[float(x)   for x in X.strip().split()] for X in d]    # [[12], [34]]   or [[12, 34], [56, 78]]
-                            else:
-                                d = [[int(x, 16) for x in X.strip().split()] for X in d]    # for example, d = [b'12', b'AA', b'5A5A']
-                            for arr in d:
-                                for i, x in enumerate(arr):
-                                    if i == self.N_CURVE: break
-
-                                    self.PlotData[i].pop(0)
-                                    self.PlotData[i].append(x)
-                                    self.PlotPoint[i].pop(0)
-                                    self.PlotPoint[i].append(QtCore.QPointF(999, x))
-                            
-                            self.rcvbuff = self.rcvbuff[self.rcvbuff.rfind(b',')+1:]
-
-                            if self.tmrRTT_Cnt % 4 == 0:
-                                if len(d[-1]) != len([series for series in self.PlotChart.series() if series.isVisible()]):
-                                    for series in self.PlotChart.series():
-                                        self.PlotChart.removeSeries(series)
-                                    for i in range(min(len(d[-1]), self.N_CURVE)):
-                                        self.PlotCurve[i].setName(f'Curve {i+1}')
-                                        self.PlotChart.addSeries(self.PlotCurve[i])
-                                    self.PlotChart.createDefaultAxes()
-
-                                for i in range(len(self.PlotChart.series())):
-                                    for j, point in enumerate(self.PlotPoint[i]):
-                                        point.setX(j)
-                                
-                                    self.PlotCurve[i].replace(self.PlotPoint[i])
-                            
-                                miny = min([min(d) for d in self.PlotData[:len(self.PlotChart.series())]])
-                                maxy = max([max(d) for d in self.PlotData[:len(self.PlotChart.series())]])
-                                self.PlotChart.axisY().setRange(miny, maxy)
-                                self.PlotChart.axisX().setRange(0000, self.N_POINT)
-            
-                        except Exception as e:
-                            self.rcvbuff = b''
-                            print(e)
+            flushed = True
 
-                else:
-                    text = ''
-                    if self.cmbICode.currentText() == 'ASCII':
-                        text = ''.join([chr(x) for x in self.rcvbuff])
-                        self.rcvbuff = b''
+            text = ''.join(texts)
+            texts.clear()
 
-                    elif self.cmbICode.currentText() == 'HEX':
-                        text = ' '.join([f'{x:02X}' for x in self.rcvbuff]) + ' '
-                        self.rcvbuff = b''
+            if text.count('\n') > self.TEXT_MAXLINE:   # 多出的行插入后也会被丢弃，不必插入
+                text = '\n'.join(text.split('\n')[-self.TEXT_MAXLINE-1:])
 
-                    elif self.cmbICode.currentText() == 'GBK':
-                        while len(self.rcvbuff):
-                            if self.rcvbuff[0:1].decode('GBK', 'ignore'):
-                                text += self.rcvbuff[0:1].decode('GBK')
-                                self.rcvbuff = self.rcvbuff[1:]
+            doc = self.chnlDoc(chnl)
+            if doc is self.txtMain.document():
+                self.txtMain.moveCursor(QtGui.QTextCursor.End)
+                self.txtMain.insertPlainText(text)
+            else:
+                cursor = QtGui.QTextCursor(doc)
+                cursor.movePosition(QtGui.QTextCursor.End)
+                cursor.insertText(text)
 
-                            elif len(self.rcvbuff) > 1 and self.rcvbuff[0:2].decode('GBK', 'ignore'):
-                                text += self.rcvbuff[0:2].decode('GBK')
-                                self.rcvbuff = self.rcvbuff[2:]
+        return flushed
 
-                            elif len(self.rcvbuff) > 1:
-                                text += chr(self.rcvbuff[0])
-                                self.rcvbuff = self.rcvbuff[1:]
+    def plotRedraw(self):
+        ''' return True if curves are redrawn '''
+        if self.PlotWidth is not None and min(self.PlotWidth, self.N_CURVE) != len([curve for curve in self.PlotCurve if curve.isVisible()]):
+            for i, curve in enumerate(self.PlotCurve):
+                curve.setName(f'Curve {i+1}')
+                curve.setVisible(i < self.PlotWidth)
 
-                            else:
-                                break
+        shown = [i for i, curve in enumerate(self.PlotCurve) if curve.isVisible()]
+        if not shown:
+            return
 
-                    elif self.cmbICode.currentText() == 'UTF-8':
-                        while len(self.rcvbuff):
-                            if self.rcvbuff[0:1].decode('UTF-8', 'ignore'):
-                                text += self.rcvbuff[0:1].decode('UTF-8')
-                                self.rcvbuff = self.rcvbuff[1:]
+        if self.PlotChart.isZoomed():   # 鼠标框选放大后只画可见部分
+            lo, hi = int(self.PlotAxisX.min()), int(self.PlotAxisX.max()) + 2
+        else:
+            lo, hi = 0, self.N_POINT
+            if (self.PlotAxisX.min(), self.PlotAxisX.max()) != (0, self.N_POINT):
+                self.PlotAxisX.setRange(0, self.N_POINT)
 
-                            elif len(self.rcvbuff) > 1 and self.rcvbuff[0:2].decode('UTF-8', 'ignore'):
-                                text += self.rcvbuff[0:2].decode('UTF-8')
-                                self.rcvbuff = self.rcvbuff[2:]
+        key = (self.PlotData.version, shown[-1] + 1, int(self.PlotChart.plotArea().width()), lo, hi)
+        if key == self.PlotKey:
+            return      # 数据、曲线、宽度和缩放都没变，不必重画
 
-                            elif len(self.rcvbuff) > 2 and self.rcvbuff[0:3].decode('UTF-8', 'ignore'):
-                                text += self.rcvbuff[0:3].decode('UTF-8')
-                                self.rcvbuff = self.rcvbuff[3:]
+        self.PlotKey = key
 
-                            elif len(self.rcvbuff) > 3 and self.rcvbuff[0:4].decode('UTF-8', 'ignore'):
-                                text += self.rcvbuff[0:4].decode('UTF-8')
-                                self.rcvbuff = self.rcvbuff[4:]
+        xs, ys = self.PlotDecim.decimate(self.PlotData, *key[1:])
+        for i in shown:
+            if self.PlotPoint[i].size() != xs.shape[1]:
+                self.PlotPoint[i] = QtGui.QPolygonF(xs.shape[1])
 
-                            elif len(self.rcvbuff) > 3:
-                                text += chr(self.rcvbuff[0])
-                                self.rcvbuff = self.rcvbuff[1:]
+            xy = polygon_array(self.PlotPoint[i])   # 直接写入 QPolygonF 的内存，不必逐个创建 QPointF
+            xy[:, 0] = xs[i]
+            xy[:, 1] = ys[i]
 
-                            else:
-                                break
-                    
-                    if len(self.txtMain.toPlainText()) > 25000: self.txtMain.clear()
-                    self.txtMain.moveCursor(QtGui.QTextCursor.End)
-                    self.txtMain.insertPlainText(text)
+            self.PlotCurve[i].replace(self.PlotPoint[i])
 
-        else:
-            if self.tmrRTT_Cnt % 100 == 1:
-                self.daplink_detect()
+        miny, maxy = ys[shown].min(), ys[shown].max()
+        if (self.PlotAxisY.min(), self.PlotAxisY.max()) != (miny, maxy):
+            self.PlotAxisY.setRange(miny, maxy)
 
-            if self.tmrRTT_Cnt % 100 == 2:
-                path = self.cmbAddr.currentText()
-                if os.path.exists(path) and os.path.isfile(path):
-                    if self.elffile != (path, os.path.getmtime(path)):
-                        self.elffile = (path, os.path.getmtime(path))
+        return True
 
-                        self.parse_elffile(path)
+    def chnlDecoder(self, chnl):
+        ''' incremental decoder of chnl for encoding selected, created again when encoding changed '''
+        code = self.cmbICode.currentText()
+        if chnl not in self.rcvdecoders or self.rcvdecoders[chnl][0] != code:
+            self.rcvdecoders[chnl] = (code, codecs.getincrementaldecoder(ENCODINGS.get(code, code))('rawbyte'))
+
+        return self.rcvdecoders[chnl][1]
+
+    def chnlDoc(self, chnl):
+        if chnl not in self.rcvdocs:
+            self.rcvdocs[chnl] = QtGui.QTextDocument(self)
+            self.rcvdocs[chnl].setDefaultFont(self.txtMain.font())
+            self.rcvdocs[chnl].setMaximumBlockCount(self.TEXT_MAXLINE)
+
+        return self.rcvdocs[chnl]
+
+    @pyqtSlot(int)
+    def on_cmbChnl_currentIndexChanged(self, index):
+        if index < 0: return
+
+        self.txtMain.setDocument(self.chnlDoc(index))
+        self.txtMain.moveCursor(QtGui.QTextCursor.End)
 
     @pyqtSlot()
     def on_btnSend_clicked(self):
         if self.btnOpen.text() == '关闭连接':
+            if self.aDownNum == 0:
+                self.txtMain.append('\nno aDown channel to send to\n')    # 通道 0 也不存在，写入会破坏目标 RAM
+                return
+
             text = self.txtSend.toPlainText()
 
+            chnl = self.cmbChnl.currentIndex() if self.cmbChnl.currentIndex() < self.aDownNum else 0
+
             if self.cmbOCode.currentText() == 'HEX':
                 try:
-                    self.aDownWrite(bytes([int(x, 16) for x in text.split()]))
+                    self.worker.send(chnl, bytes([int(x, 16) for x in text.split()]))
                 except Exception as e:
                     print(e)
 
@@ -443,10 +621,28 @@ class RTTView(QWidget):
                     text = text.replace('\n', '\r\n')
                 
                 try:
-                    self.aDownWrite(text.encode(self.cmbOCode.currentText()))
+                    self.worker.send(chnl, text.encode(self.cmbOCode.currentText()))
                 except Exception as e:
                     print(e)
 
+    @pyqtSlot()
+    def on_btnFile_clicked(self):
+        if self.btnOpen.text() == '关闭连接':
+            if self.aDownNum == 0:
+                self.txtMain.append('\nno aDown channel to send to\n')
+                return
+
+            path, filter = QFileDialog.getOpenFileName(caption='file to send', directory=self.conf.get('history', 'sendfile', fallback=''))
+            if path != '':
+                self.conf.set('history', 'sendfile', path)
+
+                chnl = self.cmbChnl.currentIndex() if self.cmbChnl.currentIndex() < self.aDownNum else 0
+
+                try:
+                    self.worker.send_file(chnl, path)
+                except Exception as e:
+                    self.txtMain.append(f'\n{e}\n')
+
     @pyqtSlot()
     def on_btnDLL_clicked(self):
         dllpath, filter = QFileDialog.getOpenFileName(caption='JLink_x64.dll path', filter='动态链接库文件 (*.dll *.so)', directory=self.cmbDLL.itemText(0))
@@ -468,6 +664,7 @@ class RTTView(QWidget):
 
             self.txtSend.setVisible(True)
             self.btnSend.setVisible(True)
+            self.btnFile.setVisible(True)
             self.cmbICode.setEnabled(True)
             self.cmbOCode.setEnabled(True)
             self.cmbEnter.setEnabled(True)
@@ -475,22 +672,17 @@ class RTTView(QWidget):
         else:
             self.txtSend.setVisible(False)
             self.btnSend.setVisible(False)
+            self.btnFile.setVisible(False)
             self.cmbICode.setEnabled(False)
             self.cmbOCode.setEnabled(False)
             self.cmbEnter.setEnabled(False)
 
-            self.gLayout2.addWidget(self.tblVar, 0, 0, 5, 2)
+            self.gLayout2.addWidget(self.tblVar, 0, 0, 6, 2)
             self.tblVar.setVisible(True)
 
     def parse_elffile(self, path):
         try:
-            from elftools.elf.elffile import ELFFile
-            elffile = ELFFile(open(path, 'rb'))
-
-            self.Vars = {}
-            for sym in elffile.get_section_by_name('.symtab').iter_symbols():
-                if sym.entry['st_info']['type'] == 'STT_OBJECT' and sym.entry['st_size'] in (1, 2, 4, 8):
-                    self.Vars[sym.name] = Variable(sym.name, sym.entry['st_value'], sym.entry['st_size'])
+            self.Vars, RTTSym, RAMRegions = rtt.parse_elf(path)
 
         except Exception as e:
             print(f'parse elf file fail: {e}')
@@ -520,8 +712,10 @@ class RTTView(QWidget):
         while self.tblVar.rowCount():
             self.tblVar.removeRow(0)
 
-        for series in self.PlotChart.series():
-            self.PlotChart.removeSeries(series)
+        for curve in self.PlotCurve:
+            curve.setVisible(False)
+
+        self.PlotWidth = None
 
         for row, val in self.Vals.items():
             self.tblVar.insertRow(row)
@@ -539,9 +733,6 @@ class RTTView(QWidget):
 
         self.PlotCurve[row].setName(val.name)
         self.PlotCurve[row].setVisible(val.show)
-        if self.PlotCurve[row] not in self.PlotChart.series():
-            self.PlotChart.addSeries(self.PlotCurve[row])
-            self.PlotChart.createDefaultAxes()
 
     @pyqtSlot(int, int)
     def on_tblVar_cellDoubleClicked(self, row, column):
@@ -585,8 +776,14 @@ class RTTView(QWidget):
         self.txtMain.clear()
     
     def closeEvent(self, evt):
-        if self.rcvfile and not self.rcvfile.closed:
-            self.rcvfile.close()
+        if self.worker:
+            self.worker.stop()
+
+        if self.capture:
+            self.capture.close()
+
+        if self.metricsExport:
+            self.metricsExport.close()
 
         self.conf.set('link',   'mode',   self.cmbMode.currentText())
         self.conf.set('link',   'speed',  self.cmbSpeed.currentText())
@@ -596,6 +793,7 @@ class RTTView(QWidget):
         self.conf.set('encode', 'output', self.cmbOCode.currentText())
         self.conf.set('encode', 'oenter', self.cmbEnter.currentText())
         self.conf.set('history', 'hist1', self.txtSend.toPlainText())
+        self.conf.set('metrics', 'overlay', '1' if self.lblMetrics.isVisible() else '0')
 
         addrs = [self.cmbAddr.currentText()] + [self.cmbAddr.itemText(i) for i in range(self.cmbAddr.count())]
         self.conf.set('link',   'address', repr(list(collections.OrderedDict.fromkeys(addrs))))   # 保留顺序去重
@@ -655,6 +853,6 @@ class VarDialog(QDialog):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    rtt = RTTView()
-    rtt.show()
+    view = RTTView()    # 不能叫 rtt，会覆盖 rtt 模块
+    view.show()
     app.exec()
@@ -0,0 +1,251 @@
+'''
+RTT capture file: raw aUp data of all channels with poll time, append-only, for long captures and replay.
+
+file:   header, record, record, ...
+header: b'RTTCAP01' + int64 wall-clock time the file is created (ns since epoch)
+record: uint64 time (ns since file created, monotonic) + uint8 channel + uint32 length + payload
+
+python capture.py rcv_240101120000.rttcap -c 0 > chnl0.log     # dump payload of channel 0
+'''
+import os
+import sys
+import time
+import struct
+import datetime
+import itertools
+import threading
+import collections
+
+
+MAGIC = b'RTTCAP01'
+
+HEADER = struct.Struct('<8sq')
+RECORD = struct.Struct('<QBI')
+
+
+class CaptureWriter(object):
+    ''' write records in background thread, write() never waits for disk
+
+        path: file path, strftime() fields are replaced with time the file is created, e.g. rcv_%y%m%d%H%M%S.rttcap
+        rotate_size: start a new file when file size reaches rotate_size bytes, 0 for never
+        rotate_time: start a new file every rotate_time seconds, 0 for never
+        index: write search index (logsearch.py) next to every file while capturing
+    '''
+
+    FLUSH_INTERVAL = 1  # seconds, data reach disk at most this late
+
+    def __init__(self, path, rotate_size=0, rotate_time=0, index=False):
+        self.path = path
+        self.rotate_size = rotate_size
+        self.rotate_time = rotate_time
+        self.index = index
+
+        self.file = None
+        self.indexer = None
+        self.paths = []     # files written
+        self.bytes = 0      # payload bytes written
+
+        self.recq = collections.deque()     # deque.append() and deque.popleft() are atomic, no lock needed
+        self.stopped = threading.Event()
+
+        self.open()     # raise in caller's thread if path can not be written
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, chnl, data, ts=None):
+        ''' queue data received from chnl at ts (time.monotonic_ns()), now if None '''
+        if data:
+            self.recq.append((time.monotonic_ns() if ts is None else ts, chnl, bytes(data)))
+
+    def open(self):
+        path = datetime.datetime.now().strftime(self.path)
+
+        base, ext = os.path.splitext(path)
+        i = 1
+        while path in self.paths or os.path.exists(path):   # 同一秒内轮转，文件名相同
+            path = f'{base}_{i}{ext}'
+            i += 1
+
+        head = HEADER.pack(MAGIC, time.time_ns())
+        self.file = open(path, 'wb', buffering=1024*1024)
+        self.file.write(head)
+
+        if self.index:
+            import logsearch    # numpy needed
+            self.indexer = logsearch.BlockIndexer(path, head)
+
+        self.file_start = time.monotonic_ns()   # record time in every file is relative to its own header
+        self.opened = time.monotonic()
+
+        self.paths.append(path)
+
+    def rotate(self):
+        if (self.rotate_size and self.file.tell() >= self.rotate_size) or \
+           (self.rotate_time and time.monotonic() - self.opened >= self.rotate_time):
+            self.close_file()
+            self.open()
+
+    def close_file(self):
+        self.file.close()
+        if self.indexer:
+            self.indexer.close()
+
+    def run(self):
+        flushed = time.monotonic()
+        while True:
+            stopped = self.stopped.is_set()     # 先取停止标志，保证停止前写入的记录都被写出
+
+            while self.recq:
+                ts, chnl, data = self.recq.popleft()
+
+                pos = self.file.tell()
+                self.file.write(RECORD.pack(max(ts - self.file_start, 0), chnl, len(data)))
+                self.file.write(data)
+                self.bytes += len(data)
+
+                if self.indexer:
+                    self.indexer.add(chnl, pos, pos + RECORD.size + len(data), data)
+
+                self.rotate()
+
+            if stopped:
+                break
+
+            if time.monotonic() - flushed >= self.FLUSH_INTERVAL:
+                self.file.flush()
+                if self.indexer:
+                    self.indexer.flush()
+                flushed = time.monotonic()
+
+                self.rotate()
+
+            self.stopped.wait(0.1)
+
+        self.close_file()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class CaptureReader(object):
+    ''' read records of capture file '''
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            magic, self.start_wall = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise Exception(f'{path} is not RTT capture file')
+
+    def __iter__(self):
+        ''' yield (time in seconds since file created, chnl, data), an incomplete record at file end is ignored '''
+        with open(self.path, 'rb') as f:
+            f.seek(HEADER.size)
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    break
+
+                ts, chnl, size = RECORD.unpack(head)
+                data = f.read(size)
+                if len(data) < size:
+                    break
+
+                yield ts / 1e9, chnl, data
+
+    def channels(self, scan=10000):
+        ''' channel numbers found in the first scan records '''
+        return sorted({chnl for ts, chnl, data in itertools.islice(self, scan)})
+
+
+class Replay(object):
+    ''' stand in for XLink and RTT, play capture file back through aUpRead(), so data go through the same decode and display as live data
+
+        speed: 1 real time, N N-times faster, 0 as fast as possible (to benchmark decode and display)
+    '''
+
+    CHUNK = 64 * 1024   # bytes returned by every aUpRead() when speed is 0
+    SCAN  = 10000       # records scanned to find channel number, aUpNum grows if a channel shows up later
+
+    def __init__(self, path, speed=1):
+        self.reader = CaptureReader(path)
+        self.speed = speed
+
+        self.aUpNum = max(self.reader.channels(self.SCAN), default=0) + 1
+        self.aDownNum = 0
+
+        self.records = iter(self.reader)
+        self.pending = None     # record read but not time to return yet
+
+        self.start = None
+        self.elapsed = 0
+        self.bytes = 0
+        self.done = False
+
+    def aUpRead(self):
+        if self.start is None:
+            self.start = time.monotonic()
+
+        now = (time.monotonic() - self.start) * self.speed
+
+        rcvd = collections.defaultdict(list)
+        size = 0
+        while not self.done:
+            if self.pending is None:
+                self.pending = next(self.records, None)
+                if self.pending is None:
+                    self.done = True
+                    self.elapsed = time.monotonic() - self.start
+                    break
+
+            ts, chnl, data = self.pending
+            if self.speed and ts > now:
+                break
+
+            rcvd[chnl].append(data)
+            size += len(data)
+            self.pending = None
+
+            self.aUpNum = max(self.aUpNum, chnl + 1)
+
+            if not self.speed and size >= self.CHUNK:
+                break
+
+        self.bytes += size
+
+        return {chnl: b''.join(data) for chnl, data in rcvd.items()}
+
+    def aDownWrite(self, chnl, bytes):
+        return len(bytes)   # 回放时没有目标芯片，发送的数据丢弃
+
+    def close(self):
+        pass
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='dump RTT capture file')
+    parser.add_argument('path', nargs='+')
+    parser.add_argument('-c', '--chnl', type=int, nargs='*', help='channels to dump, all by default')
+    parser.add_argument('-l', '--list', action='store_true', help='list records instead of dumping payload')
+    args = parser.parse_args()
+
+    for path in args.path:
+        reader = CaptureReader(path)
+        for ts, chnl, data in reader:
+            if args.chnl is not None and chnl not in args.chnl:
+                continue
+
+            if args.list:
+                print(f'{ts:12.6f}  chnl {chnl}  {len(data):6d} bytes')
+            else:
+                sys.stdout.buffer.write(data)
+
+        sys.stdout.buffer.flush()
+
+
+if __name__ == '__main__':
+    main()
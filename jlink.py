@@ -129,6 +129,9 @@ class JLink(object):
     def halted(self):
         return self.jlk.JLINKARM_IsHalted()
 
+    def serial_number(self):
+        return self.jlk.JLINKARM_GetSN()
+
     def close(self):
         self.jlk.JLINKARM_Close()
 
@@ -0,0 +1,186 @@
+'''
+sparse line and time index of big log files, for browsing multi-GB captures without reading them into memory.
+
+plain text log (e.g. written by rtt.py -o): lines of the whole file
+RTT capture file (*.rttcap):                lines of one channel's payload
+'''
+import os
+import mmap
+import bisect
+import threading
+
+import capture
+
+
+def records(mm, pos=0):
+    ''' yield (position, end position, time, chnl, data) of records in memory-mapped capture file from pos on '''
+    unpack, head, size = capture.RECORD.unpack_from, capture.RECORD.size, len(mm)   # 记录很多，循环内只用局部变量
+
+    pos = max(pos, capture.HEADER.size)
+    while pos + head <= size:
+        ts, chnl, n = unpack(mm, pos)
+
+        end = pos + head + n
+        if end > size:
+            break   # 采集中断，最后一条记录不完整
+
+        yield pos, end, ts / 1e9, chnl, mm[pos + head:end]
+
+        pos = end
+
+
+class LogIndex(object):
+    ''' memory-map log file, and index it in background thread
+
+        an entry is added about every STEP bytes, reading any line starts from the nearest entry, so memory used is flat
+    '''
+
+    STEP = 64 * 1024
+
+    def __init__(self, path, chnl=0):
+        self.path = path
+        self.chnl = chnl
+
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+
+        self.capture = self.mm[:len(capture.MAGIC)] == capture.MAGIC
+
+        self.entries = []   # [(lines before entry, file position, time)], list.append() is atomic, readers use the first len() entries
+        self.positions = [] # file position of entries, to bisect by position
+        self.lines = 0      # lines indexed so far
+        self.progress = 0   # 0.0 ~ 1.0
+        self.done = False
+
+        self.stopped = threading.Event()
+
+        self.thread = threading.Thread(target=self.build, daemon=True)
+        self.thread.start()
+
+    def chunks(self, pos):
+        ''' yield (file position, time, data) of log content from pos on '''
+        mm = self.mm
+        if not self.capture:
+            while pos < len(mm):
+                yield pos, None, mm[pos:pos + self.STEP]
+                pos += self.STEP
+
+        else:
+            for pos, end, ts, chnl, data in records(mm, pos):
+                if chnl == self.chnl:
+                    yield pos, ts, data
+
+    def build(self):
+        lines, last, tail = 0, None, b'\n'
+        for pos, ts, data in self.chunks(0):
+            if self.stopped.is_set():
+                return
+
+            if last is None or pos - last >= self.STEP:
+                self.positions.append(pos)
+                self.entries.append((lines, pos, ts))
+                last = pos
+
+            lines += data.count(b'\n')
+            tail = data[-1:] or tail
+
+            self.lines = lines + (tail != b'\n')    # 最后一行没有换行符也算一行
+            self.progress = pos / len(self.mm)
+
+        self.progress = 1
+        self.done = True
+
+    def read(self, line, count):
+        ''' return lines [line, line + count) as list of bytes, without line ending '''
+        n = len(self.entries)   # entries are only appended, the first n do not change
+        if not n or count <= 0:
+            return []
+
+        i = max(bisect.bisect_left(self.entries, (line,), 0, n) - 1, 0)    # last entry before line
+        first, pos, ts = self.entries[i]
+
+        skip = line - first     # line starts after skip newlines
+        buff = []
+        left = count
+        for pos, ts, data in self.chunks(pos):
+            if skip:
+                n = data.count(b'\n')
+                if n < skip:
+                    skip -= n
+                    continue
+
+                idx = -1
+                for k in range(skip):
+                    idx = data.index(b'\n', idx + 1)
+                data, skip = data[idx+1:], 0
+
+            buff.append(data)
+            left -= data.count(b'\n')
+            if left < 0:
+                break
+
+        if skip:
+            return []   # line not in file
+
+        lines = b''.join(buff).split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+
+        return lines[:count]
+
+    def position(self, pos):
+        ''' number of lines before file position pos, i.e. line pos is in '''
+        i = bisect.bisect_right(self.positions, pos, 0, len(self.entries)) - 1
+        if i < 0:
+            return 0
+
+        line, start, ts = self.entries[i]
+        for start, ts, data in self.chunks(start):
+            if start + len(data) > pos and not self.capture:
+                line += data.count(b'\n', 0, pos - start)
+                break
+            if start >= pos:
+                break
+            line += data.count(b'\n')
+
+        return line
+
+    def time(self, line):
+        ''' time (seconds since file created) of the index entry line is in, None for text log '''
+        n = len(self.entries)
+        if not n:
+            return None
+
+        i = max(bisect.bisect_right(self.entries, (line, float('inf')), 0, n) - 1, 0)
+        return self.entries[i][2]
+
+    def line(self, time):
+        ''' first line received at or after time (seconds since file created), for capture file only '''
+        entries = self.entries
+
+        lo, hi = 0, len(entries)    # bisect by time, time of entries never goes down
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if entries[mid][2] is not None and entries[mid][2] <= time:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if not lo:
+            return 0
+
+        line, pos, ts = entries[lo - 1]
+        for pos, ts, data in self.chunks(pos):  # 在索引项之间逐条记录查找
+            if ts >= time:
+                break
+            line += data.count(b'\n')
+
+        return line
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+        if self.mm:
+            self.mm.close()
+        self.file.close()
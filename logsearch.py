@@ -0,0 +1,249 @@
+'''
+search index of RTT logs: trigram bitmap of every block of each channel, so regex and keyword search only read blocks that can match.
+
+index file is the log's path + .rttidx, written while capturing, or built the first time the log is searched, and rebuilt when the log changed
+header: b'RTTIDX02' + uint32 length and uint32 crc32 of the log's first bytes + uint64 size and int64 mtime (ns) of the log when built, 0 if written while capturing
+block:  uint8 channel + uint64 file position of block's first record + uint64 file position after block's last record + bitmap
+
+python logsearch.py rcv_240101120000.rttcap "err(or)? \d+" -c 0
+'''
+import os
+import re
+import sys
+import mmap
+import zlib
+import struct
+
+try:
+    import re._parser as sre_parse
+except ImportError:
+    import sre_parse    # python < 3.11
+
+import numpy as np
+
+import capture
+import logindex
+
+
+MAGIC = b'RTTIDX02'
+
+HEADER = struct.Struct('<8sIIQq')
+HEAD = 4096             # bytes at the start of log the header checks
+
+BITS = 1 << 14          # bitmap bits of every block
+SIZE = 64 * 1024        # channel bytes of every block
+
+DTYPE = np.dtype([('chnl', 'u1'), ('start', '<u8'), ('end', '<u8'), ('bits', 'u1', BITS // 8)])
+
+
+def index_path(path):
+    return path + '.rttidx'     # rcv.rttcap 和 rcv.log 不能共用一个索引文件
+
+
+def valid(path):
+    ''' index file of log exists and was made from the log as it is now '''
+    try:
+        with open(index_path(path), 'rb') as f:
+            magic, length, crc, size, mtime = HEADER.unpack(f.read(HEADER.size))
+
+        with open(path, 'rb') as f:
+            head = f.read(length)
+
+        stat = os.stat(path)
+
+    except (OSError, struct.error):
+        return False
+
+    if magic != MAGIC or len(head) != length or zlib.crc32(head) != crc:
+        return False    # 日志被重写，例如 rtt.py -o 再次写同一文件
+
+    return not size or (size, mtime) == (stat.st_size, stat.st_mtime_ns)   # 采集时写的索引随日志增长，不比较大小
+
+
+def trigrams(data):
+    ''' bit numbers of trigrams in data, case-insensitive '''
+    a = np.frombuffer(data.lower(), np.uint8).astype(np.uint32)
+    if len(a) < 3:
+        return np.empty(0, np.uint32)
+
+    tri = (a[:-2] << 16) | (a[1:-1] << 8) | a[2:]
+    return (tri * np.uint32(2654435761)) >> np.uint32(33 - BITS.bit_length())   # 乘法散列，取高 14 位
+
+
+class BlockIndexer(object):
+    ''' collect content of every channel, write a block of index every SIZE bytes of a channel
+
+        head: first bytes of log (at most HEAD), to tell whether log is rewritten later
+        size, mtime: stat of complete log being indexed, 0 for log still being written
+    '''
+    def __init__(self, path, head, size=0, mtime=0):
+        self.file = open(index_path(path), 'wb')
+        self.file.write(HEADER.pack(MAGIC, len(head[:HEAD]), zlib.crc32(head[:HEAD]), size, mtime))
+
+        self.blocks = {}    # {chnl: [start, end, size, [data]]}, block not written yet
+        self.carry = {}     # {chnl: last 2 bytes of previous block}, trigrams across block boundary go to the later block
+
+    def add(self, chnl, start, end, data):
+        ''' data of chnl is in file [start, end) '''
+        if chnl not in self.blocks:
+            self.blocks[chnl] = [start, end, 0, []]
+
+        block = self.blocks[chnl]
+        block[1] = end
+        block[2] += len(data)
+        block[3].append(data)
+
+        if block[2] >= SIZE:
+            self.write(chnl)
+
+    def write(self, chnl):
+        start, end, size, datas = self.blocks.pop(chnl)
+
+        data = self.carry.get(chnl, b'') + b''.join(datas)
+        self.carry[chnl] = data[-2:]
+
+        bits = np.zeros(BITS, bool)
+        bits[trigrams(data)] = True
+
+        rec = np.zeros(1, DTYPE)
+        rec[0] = (chnl, start, end, np.packbits(bits))
+        self.file.write(rec.tobytes())
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        for chnl in list(self.blocks):
+            self.write(chnl)
+
+        self.file.close()
+
+
+def build(path):
+    ''' build index of log written without one, or changed since '''
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+
+        indexer = BlockIndexer(path, mm[:HEAD], stat.st_size, stat.st_mtime_ns)
+        try:
+            if mm[:len(capture.MAGIC)] == capture.MAGIC:
+                for start, end, ts, chnl, data in logindex.records(mm):
+                    indexer.add(chnl, start, end, data)
+
+            else:
+                for start in range(0, len(mm), SIZE):
+                    data = mm[start:start + SIZE]
+                    indexer.add(0, start, start + len(data), data)
+
+        finally:
+            indexer.close()
+            if mm:
+                mm.close()
+
+
+def literals(pattern, flags=0):
+    ''' strings every match of regex pattern contains, from top level literal runs '''
+    runs, run = [], []
+    for op, av in sre_parse.parse(pattern, flags):
+        if op is sre_parse.LITERAL:
+            run.append(av)
+        else:
+            runs.append(run)
+            run = []
+    runs.append(run)
+
+    return [bytes(run) for run in runs if len(run) >= 3]
+
+
+class Search(object):
+    ''' find lines of LogIndex's log matching regex, using index file to skip blocks '''
+    def __init__(self, index):
+        self.index = index
+
+        path = index_path(index.path)
+        if not valid(index.path):
+            build(index.path)
+
+        count = (os.path.getsize(path) - HEADER.size) // DTYPE.itemsize     # 采集中的索引文件，最后一块可能不完整
+        self.blocks = np.memmap(path, DTYPE, 'r', HEADER.size, count) if count > 0 else np.zeros(0, DTYPE)
+        self.rows = np.flatnonzero(self.blocks['chnl'] == index.chnl)
+
+    def spans(self, pattern, flags=0):
+        ''' file ranges [(start, end)] that may contain match '''
+        need = np.zeros(BITS, bool)
+        for lit in literals(pattern, flags):
+            need[trigrams(lit)] = True
+
+        need = np.packbits(need)
+        cols = np.flatnonzero(need)
+        if len(cols):
+            bits = self.blocks['bits'][:, cols][self.rows]     # 只读出用到的字节
+            bits[1:] |= bits[:-1]   # 匹配可能跨块，前一块的 trigram 也算
+            ok = ((bits & need[cols]) == need[cols]).all(axis=1)
+
+        else:
+            ok = np.ones(len(self.rows), bool)      # 没有可用的字面量，逐块查找
+
+        rows = self.rows[ok]
+        spans = list(zip(self.blocks['start'][rows].tolist(), self.blocks['end'][rows].tolist()))
+
+        last = int(self.blocks['end'][self.rows[-1]]) if len(self.rows) else 0
+        for start in range(last, len(self.index.mm), SIZE):     # 还没写入索引的部分
+            spans.append((start, min(start + SIZE, len(self.index.mm))))
+
+        return spans
+
+    def find(self, pattern, flags=0, limit=10000):
+        ''' line numbers of lines matching regex pattern (bytes), at most limit '''
+        regex = re.compile(pattern, flags)
+
+        found = []
+        for start, end in self.spans(pattern, flags):
+            first = self.index.position(start)
+            last  = self.index.position(end)
+            for i, line in enumerate(self.index.read(first, last - first + 1), first):
+                if (not found or i > found[-1]) and regex.search(line):
+                    found.append(i)
+                    if len(found) >= limit:
+                        return found
+
+        return found
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='search RTT capture file or text log')
+    parser.add_argument('path')
+    parser.add_argument('pattern', help='regular expression')
+    parser.add_argument('-c', '--chnl', type=int, default=0, help='channel to search, for capture file')
+    parser.add_argument('-i', '--ignore-case', action='store_true')
+    parser.add_argument('-F', '--fixed', action='store_true', help='pattern is plain string, not regular expression')
+    parser.add_argument('-n', '--limit', type=int, default=10000, help='stop after this many matching lines')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild index file')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        build(args.path)
+
+    index = logindex.LogIndex(args.path, args.chnl)
+    index.thread.join()
+
+    pattern = args.pattern.encode()
+    if args.fixed:
+        pattern = re.escape(pattern)
+
+    found = Search(index).find(pattern, re.I if args.ignore_case else 0, args.limit)
+    for i in found:
+        line, = index.read(i, 1)
+        sys.stdout.buffer.write(f'{i + 1}: '.encode() + line + b'\n')
+
+    if len(found) >= args.limit:
+        print(f'stopped at {args.limit} matching lines, there may be more, see --limit', file=sys.stderr)
+
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
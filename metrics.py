@@ -0,0 +1,157 @@
+'''
+session metrics: throughput, probe access latency, decode and render time, for the metrics overlay and JSON-lines export.
+
+python rtt.py -p openocd -a 0x20000000 --metrics rtt_metrics.jsonl
+'''
+import json
+import time
+import datetime
+
+
+class Histogram(object):
+    ''' latency histogram with power-of-2 buckets, bucket i counts samples in [2^(i-1), 2^i) us, fixed size, O(1) add '''
+
+    BUCKETS = 24    # 最后一个桶 >= 4 s
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, seconds):
+        us = int(seconds * 1e6)
+        self.counts[min(us.bit_length(), self.BUCKETS - 1)] += 1
+
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        ''' upper bound (seconds) of the bucket the p-th (0.0 ~ 1.0) sample is in '''
+        rank = p * self.count
+        n = 0
+        for i, count in enumerate(self.counts):
+            n += count
+            if n >= rank and n:
+                return min((1 << i) / 1e6, self.max)
+
+        return 0
+
+    def stats(self):
+        return {
+            'count': self.count,
+            'mean':  self.total / self.count if self.count else 0,
+            'p50':   self.percentile(0.5),
+            'p90':   self.percentile(0.9),
+            'p99':   self.percentile(0.99),
+            'max':   self.max,
+            'buckets': {f'<{1 << i}us': count for i, count in enumerate(self.counts) if count},
+        }
+
+
+class Metrics(object):
+    ''' latency histograms of named operations, and rates of cumulative counters between snapshots
+
+        observe() is called from acquisition thread and GUI thread, list and int updates are safe under GIL,
+        a snapshot may be one sample behind, which is fine for display
+    '''
+    def __init__(self):
+        self.hists = {}     # {name: Histogram}
+
+        self.start = time.monotonic()
+        self.last = (self.start, {})   # (time, counters) of last snapshot
+
+    def observe(self, name, seconds):
+        if name not in self.hists:
+            self.hists[name] = Histogram()
+
+        self.hists[name].add(seconds)
+
+    def snapshot(self, counters={}):
+        ''' counters: {name: cumulative count}, rates are computed against last snapshot '''
+        now = time.monotonic()
+        last, self.last = self.last, (now, dict(counters))
+
+        elapsed = max(now - last[0], 1e-6)
+
+        return {
+            'time':    datetime.datetime.now().isoformat(timespec='milliseconds'),
+            'elapsed': now - self.start,
+            'rates':   {f'{name}/s': (count - last[1].get(name, 0)) / elapsed for name, count in counters.items()},
+            'latency': {name: hist.stats() for name, hist in list(self.hists.items())},
+        }
+
+    def summary(self, snap):
+        ''' snapshot as lines of text for the overlay '''
+        lines = [f'{name:<24}{rate:12,.0f}' for name, rate in snap['rates'].items()]
+
+        lines.append(f'{"":<24}{"count":>8}{"p50 ms":>9}{"p99 ms":>9}{"max ms":>9}')
+        for name, stats in snap['latency'].items():
+            lines.append(f'{name:<24}{stats["count"]:8}{stats["p50"]*1000:9.2f}{stats["p99"]*1000:9.2f}{stats["max"]*1000:9.2f}')
+
+        return '\n'.join(lines)
+
+
+class MetricsExport(object):
+    ''' append a snapshot as one JSON line to file every interval seconds '''
+    def __init__(self, path, interval=1):
+        self.file = open(datetime.datetime.now().strftime(path), 'a', encoding='utf-8')
+        self.interval = interval
+        self.last = time.monotonic()
+
+    def due(self):
+        return time.monotonic() - self.last >= self.interval
+
+    def write(self, snap):
+        self.last = time.monotonic()
+
+        self.file.write(json.dumps(snap) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def backend(xlk):
+    ''' name of XLink's probe backend '''
+    import jlink, openocd
+
+    inner = getattr(xlk, 'xlk', None)
+    if isinstance(inner, jlink.JLink):
+        return 'jlink'
+    elif isinstance(inner, openocd.OpenOCD):
+        return 'openocd'
+    elif inner is not None:
+        return 'daplink'
+    else:
+        return type(xlk).__name__.lower()
+
+
+class TimedXLink(object):
+    ''' stand in for XLink, time every memory access RTT does into metrics as "<backend>.<method>" '''
+
+    TIMED = ('read_mem_U8', 'write_mem_U8', 'write_U32', 'read_U32', 'transfer')
+
+    def __init__(self, xlk, metrics):
+        self.xlk = xlk
+        self.metrics = metrics
+        self.backend = backend(xlk)
+
+        for name in self.TIMED:
+            if hasattr(xlk, name):
+                setattr(self, name, self.timed(name, getattr(xlk, name)))
+
+    def timed(self, name, func):
+        name = f'{self.backend}.{name}'
+        def call(*args):
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.metrics.observe(name, time.perf_counter() - start)
+
+        return call
+
+    def __getattr__(self, name):
+        return getattr(self.xlk, name)
@@ -0,0 +1,840 @@
+#! python3
+'''
+SEGGER-RTT engine without GUI: connect probe, find _SEGGER_RTT, read aUp and write aDown.
+
+python rtt.py -p path/to/JLink_x64.dll -a 0x20000000 -o rtt_{chnl}.log
+'''
+import os
+import re
+import sys
+import zlib
+import time
+import ctypes
+import threading
+import collections
+import configparser
+
+import jlink
+import xlink
+
+
+os.environ['PATH'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libusb-1.0.24/MinGW64/dll') + os.pathsep + os.environ['PATH']
+
+
+class RingBuffer(ctypes.Structure):
+    _fields_ = [
+        ('sName',        ctypes.c_uint),    # ctypes.POINTER(ctypes.c_char)，64位Python中 ctypes.POINTER 是64位的，与目标芯片不符
+        ('pBuffer',      ctypes.c_uint),    # ctypes.POINTER(ctypes.c_byte)
+        ('SizeOfBuffer', ctypes.c_uint),
+        ('WrOff',        ctypes.c_uint),    # Position of next item to be written. 对于aUp：   芯片更新WrOff，主机更新RdOff
+        ('RdOff',        ctypes.c_uint),    # Position of next item to be read.    对于aDown： 主机更新WrOff，芯片更新RdOff
+        ('Flags',        ctypes.c_uint),
+    ]
+
+class SEGGER_RTT_CB(ctypes.Structure):      # Control Block
+    _fields_ = [
+        ('acID',              ctypes.c_char * 16),
+        ('MaxNumUpBuffers',   ctypes.c_uint),
+        ('MaxNumDownBuffers', ctypes.c_uint),
+        # 后跟 RingBuffer * MaxNumUpBuffers 的 aUp 和 RingBuffer * MaxNumDownBuffers 的 aDown，数量由芯片端配置决定
+    ]
+
+
+Variable = collections.namedtuple('Variable', 'name addr size')     # variable from *.elf file
+
+
+def daplink_detect():
+    try:
+        from pyocd.probe import aggregator
+        return aggregator.DebugProbeAggregator.get_all_connected_probes()
+    except Exception as e:
+        return []
+
+
+def open_xlink(probe, mode='arm', speed=4000):
+    ''' probe: path to JLink_x64.dll, 'openocd', 'sim[:options]' (simtarget.SimTarget.from_spec), or DAPLink (pyocd probe object or its unique_id)
+        mode:  'arm', 'armj', 'rv', 'rvj'
+        speed: KHz '''
+    core = 'Cortex-M0' if mode.startswith('arm') else 'RISC-V'
+
+    if probe == 'openocd':
+        import openocd
+        return xlink.XLink(openocd.OpenOCD(mode=mode, core=core, speed=speed))
+
+    elif isinstance(probe, str) and probe.split(':')[0] == 'sim':
+        import simtarget
+        return simtarget.SimTarget.from_spec(probe[4:])
+
+    elif isinstance(probe, str) and (os.path.isfile(probe) or re.search(r'\.(dll|so|dylib)(\.|$)', probe, re.I)):
+        return xlink.XLink(jlink.JLink(probe, mode, core, speed))
+
+    else:
+        from pyocd.coresight import dap, ap, cortex_m
+        if isinstance(probe, str):
+            daplinks = {daplink.unique_id: daplink for daplink in daplink_detect()}
+            if probe not in daplinks:
+                raise Exception(f'No DAPLink with unique ID {probe}')
+            probe = daplinks[probe]
+
+        daplink = probe
+        daplink.open()
+
+        try:
+            _dp = dap.DebugPort(daplink, None)
+            _dp.init()
+            _dp.power_up_debug()
+            _dp.set_clock(speed * 1000)
+
+            _ap = ap.AHB_AP(_dp, 0)
+            _ap.init()
+
+        except Exception as e:
+            daplink.close()
+            raise
+
+        return xlink.XLink(cortex_m.CortexM(None, _ap))
+
+
+def parse_elf(path):
+    ''' return variables, _SEGGER_RTT address and RAM regions in elf file '''
+    from elftools.elf.elffile import ELFFile
+
+    with open(path, 'rb') as f:
+        elffile = ELFFile(f)
+
+        Vars = {}
+        RTTSym = None
+        for sym in elffile.get_section_by_name('.symtab').iter_symbols():
+            if sym.entry['st_info']['type'] == 'STT_OBJECT' and sym.entry['st_size'] in (1, 2, 4, 8):
+                Vars[sym.name] = Variable(sym.name, sym.entry['st_value'], sym.entry['st_size'])
+
+            if sym.name == '_SEGGER_RTT':
+                RTTSym = sym.entry['st_value']
+
+        SHF_WRITE, SHF_ALLOC = 0x1, 0x2
+        RAMRegions = [(sec['sh_addr'], sec['sh_size']) for sec in elffile.iter_sections()
+                      if sec['sh_flags'] & SHF_WRITE and sec['sh_flags'] & SHF_ALLOC and sec['sh_size']]
+
+    return Vars, RTTSym, RAMRegions
+
+
+class PollScheduler(object):
+    ''' adaptive RTT poll interval: poll faster when aUp buffers fill up, back off when target is idle '''
+    def __init__(self, hiwater=0.5, interval_min=0, interval_max=0.05):
+        self.hiwater = hiwater              # keep fill level (WrOff - RdOff) / SizeOfBuffer under this
+        self.interval_min = interval_min    # seconds
+        self.interval_max = interval_max
+
+        self.interval = interval_max
+
+        self.start = self.last = time.monotonic()
+
+        self.polls = 0
+        self.bytes = 0
+        self.fill_peak = 0
+        self.overs = 0      # polls that found fill level above high-water mark
+        self.speedups = 0
+        self.backoffs = 0
+
+    def update(self, nbytes, fill):
+        ''' called every poll, nbytes: bytes read; fill: max fill level of all aUp channels, 0.0 ~ 1.0 '''
+        now = time.monotonic()
+        elapsed, self.last = now - self.last, now
+
+        self.polls += 1
+        self.bytes += nbytes
+        self.fill_peak = max(self.fill_peak, fill)
+
+        if fill >= self.hiwater:
+            self.overs += 1
+            target = self.interval_min
+
+        elif fill > 0:
+            target = elapsed * self.hiwater / fill / 2  # 按本周期的填充速度，留一半余量到达高水位所需的时间
+
+        else:
+            target = self.interval_max
+
+        if target < self.interval:      # 加速立即生效
+            self.interval = max(target, self.interval_min)
+            self.speedups += 1
+
+        elif target > self.interval:    # 退避逐步进行，防止突发数据溢出
+            self.interval = min(target, self.interval * 2 or 0.001, self.interval_max)
+            self.backoffs += 1
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+
+        return {
+            'interval':  self.interval,
+            'polls/s':   self.polls / elapsed,
+            'bytes/s':   self.bytes / elapsed,
+            'fill_peak': self.fill_peak,
+            'overs':     self.overs,
+            'speedups':  self.speedups,
+            'backoffs':  self.backoffs,
+        }
+
+
+class ChannelStats(object):
+    ''' counters of one aUp channel, to size target buffer and poll rate from real numbers
+
+        host only sees WrOff/RdOff at poll time, so lost bytes can not be counted, polls that found data lost are counted instead:
+        fulls:  buffer was full, target trimmed (NO_BLOCK_TRIM) data or stalled (BLOCK_IF_FIFO_FULL); in NO_BLOCK_SKIP mode
+                target drops a whole write that does not fit, so the buffer stays below full, free space under margin bytes
+                is counted as a suspected drop
+        resets: RdOff was not where last poll left it, target never moves aUp RdOff, so it reset the buffer and data in it were lost
+    '''
+
+    MODES = ['NO_BLOCK_SKIP', 'NO_BLOCK_TRIM', 'BLOCK_IF_FIFO_FULL', 'MODE_3']   # SEGGER_RTT_MODE_MASK = 3
+
+    MARGIN = 64     # SEGGER_RTT_PRINTF_BUFFER_SIZE, size of a typical single write
+
+    def __init__(self, margin=MARGIN):
+        self.start = time.monotonic()
+
+        self.margin = margin
+
+        self.size  = 0
+        self.mode  = 0
+        self.bytes = 0
+        self.polls = 0
+        self.occupancy = 0  # bytes in buffer at last poll
+        self.hiwater = 0    # max bytes in buffer seen
+        self.fulls = 0
+        self.resets = 0
+
+        self.RdOff = None   # RdOff written back by last poll
+
+    def update(self, aUp, count):
+        ''' called every poll with the channel's descriptor and bytes in buffer '''
+        self.size = aUp.SizeOfBuffer
+        self.mode = aUp.Flags & 3
+
+        self.polls += 1
+        self.occupancy = count
+        self.hiwater = max(self.hiwater, count)
+
+        free = aUp.SizeOfBuffer - 1 - count     # 满时 WrOff + 1 == RdOff
+        if free < (min(self.margin, aUp.SizeOfBuffer // 4) if self.mode == 0 else 1):
+            self.fulls += 1
+
+        if self.RdOff is not None and aUp.RdOff != self.RdOff:
+            self.resets += 1
+
+        self.RdOff = aUp.RdOff
+
+    @property
+    def drops(self):
+        ''' polls that found data lost '''
+        return (self.fulls if self.mode in (0, 1) else 0) + self.resets
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+
+        return {
+            'size':      self.size,
+            'mode':      self.MODES[self.mode],
+            'bytes':     self.bytes,
+            'bytes/s':   self.bytes / elapsed,
+            'occupancy': self.occupancy / self.size if self.size else 0,
+            'hiwater':   self.hiwater / self.size if self.size else 0,
+            'fulls':     self.fulls,
+            'resets':    self.resets,
+            'drops':     self.drops,
+        }
+
+
+class RTTCache(object):
+    ''' on-disk cache of _SEGGER_RTT address, keyed by probe, core and firmware '''
+    def __init__(self, path='rttcache.ini'):
+        self.path = path
+
+        self.conf = configparser.ConfigParser()
+        self.conf.read(self.path, encoding='utf-8')
+
+    def get(self, key):
+        if self.conf.has_section(key):
+            return int(self.conf.get(key, 'addr'), 16)
+
+    def set(self, key, addr):
+        ''' re-read file before writing, other processes (e.g. rttmulti.py workers) may have added their keys since __init__ '''
+        self.conf = configparser.ConfigParser()
+        self.conf.read(self.path, encoding='utf-8')
+
+        if not self.conf.has_section(key):
+            self.conf.add_section(key)
+        self.conf.set(key, 'addr', f'0x{addr:08X}')
+
+        temp = f'{self.path}.{os.getpid()}'
+        with open(temp, 'w', encoding='utf-8') as f:
+            self.conf.write(f)
+        os.replace(temp, self.path)     # 原子替换，其他进程不会读到写了一半的文件
+
+
+class RTT(object):
+    ''' find _SEGGER_RTT, read aUp channels and write aDown channels through XLink '''
+    def __init__(self, xlk, sched=None, cache=None, RTTSym=None, RAMRegions=[], margin=ChannelStats.MARGIN):
+        self.xlk = xlk
+
+        self.sched = sched or PollScheduler()
+        self.cache = cache or RTTCache()
+
+        self.RTTSym = RTTSym            # _SEGGER_RTT address from elf file
+        self.RAMRegions = RAMRegions    # [(addr, size)] of writable sections in elf file
+
+        self.margin = margin            # free bytes under which a NO_BLOCK_SKIP channel is suspected of dropping data
+
+    def connect(self, addr):
+        self.RTTAddr, data = self.find(addr)
+
+        rtt_cb = SEGGER_RTT_CB.from_buffer(bytearray(data))
+        if not (0 < rtt_cb.MaxNumUpBuffers <= 32 and rtt_cb.MaxNumDownBuffers <= 32):
+            raise Exception('Invalid _SEGGER_RTT')
+
+        self.aUpNum = rtt_cb.MaxNumUpBuffers
+        self.aDownNum = rtt_cb.MaxNumDownBuffers
+        self.aUpAddr = self.RTTAddr + ctypes.sizeof(SEGGER_RTT_CB)
+        self.aDownAddr = self.aUpAddr + ctypes.sizeof(RingBuffer) * rtt_cb.MaxNumUpBuffers
+
+        self.aUpDesc = None     # aUp descriptors prefetched by last poll
+
+        self.chnlStats = [ChannelStats(self.margin) for i in range(self.aUpNum)]
+
+    def find(self, addr):
+        ''' find _SEGGER_RTT, return its address and control block header '''
+        size = ctypes.sizeof(SEGGER_RTT_CB)
+
+        if self.RTTSym is not None:     # elf 文件中有 _SEGGER_RTT 符号时，只需一次读取
+            data = bytes(self.xlk.read_mem_U8(self.RTTSym, size))
+            if data.startswith(b'SEGGER RTT'):
+                return self.RTTSym, data
+
+        key = self.key()
+
+        RTTAddr = self.cache.get(key)
+        if RTTAddr is not None:         # 上次连接同一芯片、同一固件时找到的地址，一次读取校验 acID
+            data = bytes(self.xlk.read_mem_U8(RTTAddr, size))
+            if data.startswith(b'SEGGER RTT'):
+                return RTTAddr, data
+
+        CHUNK = 1024 * 16
+        for start, length in self.RAMRegions + [(addr, 1024 * 64)]:     # 先搜索 elf 文件中的 RAM 段，再搜索指定地址起 64KB
+            tail = b''
+            for offset in range(0, length, CHUNK):
+                data = tail + bytes(self.xlk.read_mem_U8(start + offset, min(CHUNK, length - offset)))
+                index = data.find(b'SEGGER RTT')
+                if index != -1:
+                    RTTAddr = start + offset - len(tail) + index
+                    if index + size <= len(data):
+                        data = data[index:index+size]
+                    else:
+                        data = bytes(self.xlk.read_mem_U8(RTTAddr, size))
+
+                    self.cache.set(key, RTTAddr)
+
+                    return RTTAddr, data
+
+                tail = data[-(len(b'SEGGER RTT') - 1):]   # 保留末尾几个字节，防止搜索内容跨越两次读取的边界
+
+        raise Exception('Can not find _SEGGER_RTT')
+
+    def key(self):
+        ''' probe, core and firmware identity, _SEGGER_RTT address does not change while they keep the same '''
+        if self.xlk.mode.startswith('arm'):
+            try:
+                core = self.xlk.read_core_type()
+            except Exception as e:
+                core = 'ARM'
+
+            try:
+                VTOR = 0xE000ED08   # Cortex-M0 has no VTOR, read as 0
+                vtor = self.xlk.read_U32(VTOR) & 0xFFFFFF80
+                firmware = f'{zlib.crc32(bytes(self.xlk.read_mem_U8(vtor, 256))):08X}'    # hash of vector table
+            except Exception as e:
+                return self.xlk.unique_id()     # 读不出向量表时只按探针缓存，缓存的地址使用前仍会校验 acID
+
+        else:
+            core = 'RISC-V'     # read misa needs halting core, skip it
+            firmware = ''
+
+        return f'{self.xlk.unique_id()} {core} {firmware}'.strip()
+
+    def aUpRead(self):
+        if self.aUpDesc is None or time.monotonic() - self.aUpDesc[0] > 0.001:  # 上次轮询预读的描述符，轮询间有等待则已过时
+            self.aUpDesc = (time.monotonic(), self.xlk.read_mem_U8(self.aUpAddr, ctypes.sizeof(RingBuffer) * self.aUpNum))    # 一次读出所有 aUp 通道的描述符
+
+        aUps = (RingBuffer * self.aUpNum).from_buffer(bytearray(self.aUpDesc[1]))
+
+        self.aUpDesc = None
+
+        fill = 0
+
+        ops = []    # 所有通道的数据读取和 RdOff 回写放在一批中执行，DAPLink 下只需约一次 USB 往返
+        segs = []   # [(chnl, number of read ops, RdOff written back)]
+        for chnl, aUp in enumerate(aUps):
+            if aUp.SizeOfBuffer == 0 or aUp.RdOff >= aUp.SizeOfBuffer or aUp.WrOff >= aUp.SizeOfBuffer:
+                continue    # 通道未配置，或描述符无效
+
+            if aUp.RdOff <= aUp.WrOff:
+                cnt1, cnt2 = aUp.WrOff - aUp.RdOff, 0
+
+            else:
+                cnt1, cnt2 = aUp.SizeOfBuffer - aUp.RdOff, aUp.WrOff    # 缓冲区已折返，一次读出尾部和头部两段数据
+
+            fill = max(fill, (cnt1 + cnt2) / aUp.SizeOfBuffer)
+
+            self.chnlStats[chnl].update(aUp, cnt1 + cnt2)
+
+            if 0 < cnt1 + cnt2 < 1024*1024:
+                ops.append(('r', ctypes.cast(aUp.pBuffer, ctypes.c_void_p).value + aUp.RdOff, cnt1))
+                if cnt2:
+                    ops.append(('r', ctypes.cast(aUp.pBuffer, ctypes.c_void_p).value, cnt2))
+
+                RdOff = (aUp.RdOff + cnt1 + cnt2) % aUp.SizeOfBuffer
+                ops.append(('w', self.aUpAddr + ctypes.sizeof(RingBuffer) * chnl + 4*4, RdOff))
+
+                segs.append((chnl, 2 if cnt2 else 1, RdOff))
+
+        if not ops:
+            self.sched.update(0, fill)
+            return {}
+
+        ops.append(('r', self.aUpAddr, ctypes.sizeof(RingBuffer) * self.aUpNum))  # 顺带读出描述符供下次轮询使用，省去一次往返
+
+        res = self.xlk.transfer(ops)
+
+        self.aUpDesc = (time.monotonic(), res.pop())
+
+        rcvd = {}
+        for chnl, n, RdOff in segs:
+            rcvd[chnl] = b''.join(bytes(data) for data in res[:n])
+            res = res[n:]
+
+            self.chnlStats[chnl].bytes += len(rcvd[chnl])
+            self.chnlStats[chnl].RdOff = RdOff
+
+        self.sched.update(sum(len(data) for data in rcvd.values()), fill)
+
+        return rcvd
+
+    def stats(self):
+        ''' {chnl: counters} of all aUp channels '''
+        return {chnl: stat.stats() for chnl, stat in enumerate(self.chnlStats)}
+
+    def counters(self):
+        ''' cumulative counts for metrics.Metrics.snapshot(), same names as RTTWorker.counters() '''
+        return dict({'polls': self.sched.polls}, **{f'chnl{chnl} bytes': stat.bytes for chnl, stat in enumerate(self.chnlStats)})
+
+    def aDownWrite(self, chnl, bytes):
+        ''' write as much of bytes as aDown buffer can hold, return count written, 0 if aDown is full '''
+        if chnl >= self.aDownNum:
+            raise Exception(f'aDown {chnl} does not exist, target has {self.aDownNum} aDown')
+
+        aDownAddr = self.aDownAddr + ctypes.sizeof(RingBuffer) * chnl
+
+        data = self.xlk.read_mem_U8(aDownAddr, ctypes.sizeof(RingBuffer))
+
+        aDown = RingBuffer.from_buffer(bytearray(data))
+        if aDown.SizeOfBuffer == 0 or aDown.RdOff >= aDown.SizeOfBuffer or aDown.WrOff >= aDown.SizeOfBuffer:
+            raise Exception(f'aDown {chnl} not configured or its descriptor is invalid')     # 否则一直写不进去，或写到缓冲区之外
+
+        pBuffer = ctypes.cast(aDown.pBuffer, ctypes.c_void_p).value
+
+        written = 0
+        if aDown.WrOff >= aDown.RdOff:
+            if aDown.RdOff != 0: cnt = min(aDown.SizeOfBuffer - aDown.WrOff, len(bytes))
+            else:                cnt = min(aDown.SizeOfBuffer - 1 - aDown.WrOff, len(bytes))   # 写入操作不能使得 aDown.WrOff == aDown.RdOff，以区分满和空
+            if cnt > 0:
+                self.xlk.write_mem_U8(pBuffer + aDown.WrOff, bytes[:cnt])
+
+                aDown.WrOff += cnt
+                if aDown.WrOff == aDown.SizeOfBuffer: aDown.WrOff = 0
+
+                written += cnt
+
+        if written < len(bytes) and aDown.WrOff < aDown.RdOff:     # 折返回 0 后，或一开始 WrOff 就在 RdOff 之后
+            cnt = min(aDown.RdOff - 1 - aDown.WrOff, len(bytes) - written)   # - 1 确保写入操作不导致WrOff与RdOff指向同一位置
+            if cnt > 0:
+                self.xlk.write_mem_U8(pBuffer + aDown.WrOff, bytes[written:written+cnt])
+
+                aDown.WrOff += cnt
+
+                written += cnt
+
+        if written:
+            self.xlk.write_U32(aDownAddr + 4*3, aDown.WrOff)
+
+        return written
+
+
+class DownStream(object):
+    ''' data queued for one aDown channel, bytes or a file read chunk by chunk '''
+
+    CHUNK = 4096
+
+    def __init__(self, chnl, data=b'', file=None):
+        self.chnl = chnl
+        self.data = data
+        self.file = file
+
+        self.sent = 0
+        self.total = len(data) if file is None else os.fstat(file.fileno()).st_size
+
+    def pending(self):
+        ''' data waiting to be written, b'' when all sent '''
+        if not self.data and self.file:
+            self.data = self.file.read(self.CHUNK)
+            if not self.data:
+                self.close()
+
+        return self.data
+
+    def done(self):
+        return not self.data and self.file is None
+
+    def consume(self, count):
+        self.data = self.data[count:]
+        self.sent += count
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+        self.data = b''
+
+
+class DownWriter(object):
+    ''' queued aDown writer: keep feeding aDown buffers while target drains them, nothing sent is thrown away
+
+        send() and send_file() can be called from any thread, feed() must be called from the thread owning the probe.
+    '''
+    def __init__(self, write):
+        self.write = write      # write(chnl, bytes) -> count written
+
+        self.sndq = collections.deque()
+        self.streams = {}       # {chnl: deque of DownStream}, data of one channel are written in order
+
+    def send(self, chnl, data):
+        stream = DownStream(chnl, bytes(data))
+        self.sndq.append(stream)
+        return stream
+
+    def send_file(self, chnl, path):
+        stream = DownStream(chnl, file=open(path, 'rb'))
+        self.sndq.append(stream)
+        return stream
+
+    def feed(self):
+        ''' write queued data until every aDown buffer is full or nothing left '''
+        while self.sndq:
+            stream = self.sndq.popleft()
+            self.streams.setdefault(stream.chnl, collections.deque()).append(stream)
+
+        for chnl, streams in list(self.streams.items()):
+            while streams:
+                stream = streams[0]
+
+                data = stream.pending()
+                if data:
+                    try:
+                        count = self.write(chnl, data)
+                    except Exception as e:
+                        print(e)
+                        stream.close()
+                    else:
+                        stream.consume(count)
+                        if count < len(data):
+                            break   # aDown full, wait target to read
+
+                if not stream.pending():
+                    streams.popleft()
+
+            if not streams:
+                del self.streams[chnl]
+
+    def busy(self):
+        return bool(self.sndq or self.streams)
+
+    def progress(self):
+        ''' {chnl: (bytes sent, bytes total)} of data still queued '''
+        prog = {}
+        for chnl, streams in list(self.streams.items()):
+            streams = list(streams)
+            prog[chnl] = (sum(s.sent for s in streams), sum(s.total for s in streams))
+
+        return prog
+
+    def cancel(self):
+        while self.sndq:
+            self.sndq.popleft().close()
+
+        for streams in list(self.streams.values()):
+            for stream in list(streams):
+                stream.close()
+
+
+class RTTWorker(threading.Thread):
+    ''' acquisition thread: poll target in background, hand off data to GUI through deque '''
+
+    SEND_INTERVAL = 0.001
+
+    def __init__(self, poll, write, sched=None, interval=0.01, capture=None, backlog=0):
+        super(RTTWorker, self).__init__(daemon=True)
+
+        self.poll  = poll       # return {chnl: bytes} read from target
+        self.writer = DownWriter(write) if write else None  # write bytes to target's chnl
+        self.sched = sched      # PollScheduler decide RTT poll interval; None: sample variable every interval
+        self.interval = interval
+        self.capture = capture  # capture.CaptureWriter, every poll is recorded with its time
+        self.backlog = backlog  # pause polling when so many polls are not taken by recv(), 0 for never; only for sources that can wait, e.g. replay
+
+        self.rcvq = collections.deque() # deque.append() and deque.popleft() are atomic, no lock needed
+                                        # all probe access is done in this thread, so GUI never wait for probe
+
+        self.polls = 0
+        self.bytes = collections.defaultdict(int)  # {chnl: bytes received}
+
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            if self.backlog and len(self.rcvq) >= self.backlog:
+                self.stopped.wait(0.001)
+                continue
+
+            if self.writer:
+                self.writer.feed()
+
+            try:
+                data = self.poll()
+            except Exception as e:
+                data = {}
+
+            self.polls += 1
+
+            if data:
+                self.rcvq.append(data)
+
+                for chnl, rcvd in data.items():
+                    self.bytes[chnl] += len(rcvd)
+
+                if self.capture:
+                    ts = time.monotonic_ns()
+                    for chnl, rcvd in data.items():
+                        self.capture.write(chnl, rcvd, ts)
+
+            if self.sched is None:
+                interval = self.interval
+            else:
+                interval = self.sched.interval
+
+            if self.writer and self.writer.busy():
+                interval = min(interval, self.SEND_INTERVAL)    # aDown has data waiting, refill it as soon as target drains it
+
+            if interval:
+                self.stopped.wait(interval)
+
+    def recv(self):
+        rcvd = {}
+        while self.rcvq:
+            for chnl, data in self.rcvq.popleft().items():
+                rcvd.setdefault(chnl, []).append(data)
+
+        return {chnl: b''.join(data) for chnl, data in rcvd.items()}
+
+    def counters(self):
+        ''' cumulative counts for metrics.Metrics.snapshot() '''
+        return dict({'polls': self.polls}, **{f'chnl{chnl} bytes': count for chnl, count in sorted(self.bytes.items())})
+
+    def send(self, chnl, data):
+        return self.writer.send(chnl, data)
+
+    def send_file(self, chnl, path):
+        return self.writer.send_file(chnl, path)
+
+    def progress(self):
+        return self.writer.progress() if self.writer else {}
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+        if self.writer:
+            self.writer.cancel()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SEGGER-RTT capture without GUI')
+    parser.add_argument('-p', '--probe', help='path to JLink_x64.dll, "openocd", DAPLink unique ID, or "sim[:latency=S,rate=N,...]" for simulated target')
+    parser.add_argument('-m', '--mode', default='arm', choices=['arm', 'armj', 'rv', 'rvj'], help='arm: ARM SWD, armj: ARM JTAG, rv: RV cJTAG, rvj: RV JTAG')
+    parser.add_argument('-s', '--speed', default=4000, type=int, help='KHz')
+    parser.add_argument('-a', '--addr', default='0x20000000', help='address to search _SEGGER_RTT from')
+    parser.add_argument('-e', '--elf', help='elf file to find _SEGGER_RTT symbol in')
+    parser.add_argument('-c', '--chnl', type=int, nargs='*', help='aUp channels to capture, all by default')
+    parser.add_argument('-o', '--output', help='"-" for stdout, or file path, "{chnl}" in path is replaced with channel number; stdout by default if no --port')
+    parser.add_argument('--port', type=int, help='serve aUp channel N on TCP port PORT+N, data from clients are written into aDown channel N')
+    parser.add_argument('--remote', action='store_true', help='accept TCP clients from other hosts')
+    parser.add_argument('--capture', metavar='PATH', help='record raw data of all channels with time, strftime() fields in PATH are replaced, e.g. rcv_%%y%%m%%d%%H%%M%%S.rttcap')
+    parser.add_argument('--rotate-size', default=0, type=float, help='start a new capture file every ROTATE_SIZE MB')
+    parser.add_argument('--rotate-time', default=0, type=float, help='start a new capture file every ROTATE_TIME hours')
+    parser.add_argument('--index', action='store_true', help='write search index next to capture file, for logsearch.py and rttlog.py (needs numpy)')
+    parser.add_argument('-u', '--upload', metavar='FILE', help='write file into aDown channel, channel given by --upload-chnl')
+    parser.add_argument('--upload-chnl', default=0, type=int)
+    parser.add_argument('--hiwater', default=50, type=float, help='aUp buffer fill level (%%) to keep under')
+    parser.add_argument('--interval-min', default=0, type=float, help='min poll interval (ms)')
+    parser.add_argument('--interval-max', default=50, type=float, help='max poll interval (ms)')
+    parser.add_argument('--drop-margin', default=ChannelStats.MARGIN, type=int, help='NO_BLOCK_SKIP channel with less free bytes than this is counted as dropping data, about the largest single write of target')
+    parser.add_argument('--metrics', metavar='PATH', help='append throughput and probe access latency as JSON lines to PATH, strftime() fields in PATH are replaced')
+    parser.add_argument('--metrics-interval', default=1, type=float, help='seconds between metrics lines')
+    parser.add_argument('-l', '--list', action='store_true', help='list connected DAPLinks')
+    args = parser.parse_args()
+
+    if args.list:
+        for daplink in daplink_detect():
+            print(f'{daplink.unique_id}  {daplink.product_name}')
+        return
+
+    if not args.probe:
+        parser.error('probe is required')
+
+    if args.output is None and args.port is None and args.capture is None:
+        args.output = '-'
+
+    RTTSym, RAMRegions = None, []
+    if args.elf:
+        Vars, RTTSym, RAMRegions = parse_elf(args.elf)
+
+    xlk = open_xlink(args.probe, args.mode, args.speed)
+    try:
+        mtr = export = None
+        if args.metrics:
+            import metrics
+            mtr = metrics.Metrics()
+            export = metrics.MetricsExport(args.metrics, args.metrics_interval)
+
+        rtt = RTT(metrics.TimedXLink(xlk, mtr) if mtr else xlk, PollScheduler(args.hiwater / 100, args.interval_min / 1000, args.interval_max / 1000), RTTCache(), RTTSym, RAMRegions, args.drop_margin)
+        rtt.connect(int(args.addr, 16))
+
+        print(f'_SEGGER_RTT @ 0x{rtt.RTTAddr:08X} with {rtt.aUpNum} aUp and {rtt.aDownNum} aDown', file=sys.stderr)
+
+        chnls = args.chnl if args.chnl is not None else range(rtt.aUpNum)
+
+        files = {}  # {path: file}, channels with the same path share one file
+        outs  = {}  # {chnl: file}
+        for chnl in chnls:
+            if args.output is None: break
+
+            path = args.output.format(chnl=chnl)
+            if path not in files:
+                files[path] = sys.stdout.buffer if path == '-' else open(path, 'wb')
+            outs[chnl] = files[path]
+
+        servers = {}    # {chnl: ChannelServer}
+        if args.port is not None:
+            import rttserver
+            for chnl in chnls:
+                servers[chnl] = rttserver.ChannelServer(args.port + chnl, not args.remote, f'RTT channel {chnl}')
+
+                print(f'channel {chnl} served on port {servers[chnl].port}', file=sys.stderr)
+
+        writer = DownWriter(rtt.aDownWrite)
+
+        cap = None
+        if args.capture:
+            import capture
+            cap = capture.CaptureWriter(args.capture, int(args.rotate_size * 1024 * 1024), args.rotate_time * 3600, args.index)
+
+        upload = None
+        if args.upload:
+            if args.upload_chnl >= rtt.aDownNum:
+                raise Exception(f'no aDown channel {args.upload_chnl}')
+
+            upload = writer.send_file(args.upload_chnl, args.upload)
+
+        drops = [(0, 0)] * rtt.aUpNum   # [(drops reported, time reported)]
+
+        try:
+            while True:
+                rcvd = rtt.aUpRead()
+
+                if cap:
+                    ts = time.monotonic_ns()
+                    for chnl, data in rcvd.items():
+                        cap.write(chnl, data, ts)
+
+                for chnl, stat in enumerate(rtt.chnlStats):
+                    if stat.drops > drops[chnl][0] and time.monotonic() - drops[chnl][1] > 1:   # 每秒最多报告一次，不要刷屏
+                        print(f'channel {chnl}: data lost in {stat.drops} polls, buffer {stat.size} bytes {stat.MODES[stat.mode]}', file=sys.stderr)
+                        drops[chnl] = (stat.drops, time.monotonic())
+
+                for chnl, data in rcvd.items():
+                    if chnl in outs:
+                        outs[chnl].write(data)
+
+                    if chnl in servers:
+                        servers[chnl].write(data)
+
+                if rcvd:
+                    for file in files.values():
+                        file.flush()
+
+                for chnl, server in servers.items():
+                    data = server.read()
+                    if data and chnl < rtt.aDownNum:
+                        writer.send(chnl, data)
+
+                writer.feed()
+                if upload and upload.done():
+                    print(f'{args.upload}: {upload.sent} bytes uploaded', file=sys.stderr)
+                    upload = None
+
+                interval = rtt.sched.interval
+                if writer.busy():
+                    interval = min(interval, RTTWorker.SEND_INTERVAL)
+
+                if export and export.due():
+                    export.write(mtr.snapshot(rtt.counters()))
+
+                if interval:
+                    time.sleep(interval)
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            for path, file in files.items():
+                if path != '-':
+                    file.close()
+
+            for server in servers.values():
+                server.stop()
+
+            writer.cancel()
+
+            if export:
+                export.write(mtr.snapshot(rtt.counters()))
+                export.close()
+
+            if cap:
+                cap.close()
+                print(f'captured to {", ".join(cap.paths)}', file=sys.stderr)
+
+            stats = rtt.sched.stats()
+            print(f'{stats["polls/s"]:.0f} polls/s, {stats["bytes/s"]:.0f} bytes/s, peak fill {stats["fill_peak"]:.0%}, {stats["overs"]} over high-water', file=sys.stderr)
+
+            for chnl, stats in rtt.stats().items():
+                if stats['size']:
+                    print(f'channel {chnl}: {stats["size"]} bytes {stats["mode"]}, {stats["bytes"]} bytes read, high-water {stats["hiwater"]:.0%}, '
+                          f'{stats["fulls"]} full, {stats["resets"]} reset, {stats["drops"]} polls lost data', file=sys.stderr)
+
+    finally:
+        xlk.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+#! python3
+'''
+Browse big RTT logs: capture file (*.rttcap) or text log, memory-mapped, only lines on screen are read.
+
+python rttlog.py rcv_240101120000.rttcap -c 0
+python rttlog.py rtt.log
+'''
+import re
+import sys
+import bisect
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QWidget
+
+import capture
+from logindex import LogIndex
+from logsearch import Search
+
+
+class LogView(QWidget):
+    def __init__(self, path, chnl=0, encoding='utf-8', parent=None):
+        super(LogView, self).__init__(parent)
+
+        self.path = path
+        self.encoding = encoding
+        self.index = None
+        self.search = None
+        self.matches = []   # line numbers matching text in linFind
+        self.pattern = None
+
+        self.setWindowTitle(f'RTT Log - {path}')
+        self.resize(1000, 700)
+
+        self.cmbChnl = QtWidgets.QComboBox()
+        self.linGoto = QtWidgets.QLineEdit()
+        self.linGoto.setPlaceholderText('line, or time in seconds ending with s, e.g. 1200 or 35.5s')
+        self.lblStat = QtWidgets.QLabel()
+
+        self.linFind = QtWidgets.QLineEdit()
+        self.linFind.setPlaceholderText('text to find, Enter for next, Shift+Enter for previous')
+        self.chkRegex = QtWidgets.QCheckBox('Regex')
+        self.chkCase = QtWidgets.QCheckBox('Match case')
+        self.lblFind = QtWidgets.QLabel()
+
+        self.txtMain = QtWidgets.QPlainTextEdit()
+        self.txtMain.setReadOnly(True)
+        self.txtMain.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.txtMain.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)   # 文件只读出窗口内的行，滚动条由 scrLine 代替
+        self.txtMain.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.txtMain.installEventFilter(self)
+        self.txtMain.viewport().installEventFilter(self)
+
+        self.scrLine = QtWidgets.QScrollBar(Qt.Vertical)
+
+        top = QtWidgets.QHBoxLayout()
+        top.addWidget(QtWidgets.QLabel('Channel:'))
+        top.addWidget(self.cmbChnl)
+        top.addWidget(QtWidgets.QLabel('Goto:'))
+        top.addWidget(self.linGoto, 1)
+        top.addWidget(self.lblStat)
+
+        find = QtWidgets.QHBoxLayout()
+        find.addWidget(QtWidgets.QLabel('Find:'))
+        find.addWidget(self.linFind, 1)
+        find.addWidget(self.chkRegex)
+        find.addWidget(self.chkCase)
+        find.addWidget(self.lblFind)
+
+        body = QtWidgets.QHBoxLayout()
+        body.addWidget(self.txtMain, 1)
+        body.addWidget(self.scrLine)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addLayout(find)
+        layout.addLayout(body)
+
+        try:
+            chnls = capture.CaptureReader(path).channels()
+        except Exception:
+            chnls = []      # 文本日志，没有通道
+
+        self.cmbChnl.addItems([str(x) for x in chnls])
+        self.cmbChnl.setEnabled(bool(chnls))
+        if chnl in chnls:
+            self.cmbChnl.setCurrentIndex(chnls.index(chnl))
+
+        self.cmbChnl.currentIndexChanged.connect(lambda i: self.open())
+        self.linGoto.returnPressed.connect(self.on_linGoto_returnPressed)
+        self.linFind.installEventFilter(self)
+        self.scrLine.valueChanged.connect(lambda value: self.render())
+
+        self.open()
+
+        self.tmrIndex = QtCore.QTimer(interval=200, timeout=self.on_tmrIndex_timeout)
+        self.tmrIndex.start()
+
+    def open(self):
+        if self.index:
+            self.index.close()
+
+        self.index = LogIndex(self.path, int(self.cmbChnl.currentText() or 0))
+        self.search = None
+        self.pattern = None
+
+        self.scrLine.setValue(0)
+        self.render()
+
+    def rows(self):
+        return max(self.txtMain.viewport().height() // self.txtMain.fontMetrics().lineSpacing(), 1)
+
+    def render(self):
+        ''' read and show only the lines fitting in the window '''
+        first = self.scrLine.value()
+        lines = self.index.read(first, self.rows())
+
+        self.txtMain.setPlainText('\n'.join(line.decode(self.encoding, 'replace') for line in lines))
+
+        ts = self.index.time(first)
+        self.lblStat.setText(self.status() + (f'  @ {ts:.3f}s' if ts is not None else ''))
+
+    def status(self):
+        if self.index.done:
+            return f'line {self.scrLine.value() + 1} / {self.index.lines}'
+        else:
+            return f'line {self.scrLine.value() + 1} / {self.index.lines}+  indexing {self.index.progress:.0%}'
+
+    def goto(self, line):
+        self.scrLine.setMaximum(max(self.scrLine.maximum(), line))     # 查找结果可能在还没建立索引的部分
+        self.scrLine.setValue(max(min(line, self.scrLine.maximum()), 0))
+        self.render()   # 行号不变时 valueChanged 不触发
+
+    def on_linGoto_returnPressed(self):
+        text = self.linGoto.text().strip()
+        try:
+            if text.endswith('s'):
+                self.goto(self.index.line(float(text[:-1])))
+            else:
+                self.goto(int(text) - 1)
+
+        except ValueError:
+            self.lblStat.setText(f'invalid goto {text}')
+
+    def find(self, backward=False):
+        text = self.linFind.text()
+        if not text:
+            return
+
+        pattern = text.encode(self.encoding)
+        if not self.chkRegex.isChecked():
+            pattern = re.escape(pattern)
+
+        flags = 0 if self.chkCase.isChecked() else re.I
+
+        try:
+            if (pattern, flags) != self.pattern:
+                if self.search is None:
+                    self.search = Search(self.index)    # 第一次查找没有索引文件的日志时，先建立索引
+
+                self.matches = self.search.find(pattern, flags)
+                self.pattern = (pattern, flags)
+
+        except re.error as e:
+            self.lblFind.setText(f'invalid regex: {e}')
+            return
+
+        if not self.matches:
+            self.lblFind.setText('not found')
+            return
+
+        line = self.scrLine.value()
+        if backward:
+            i = max(bisect.bisect_left(self.matches, line) - 1, 0)
+        else:
+            i = min(bisect.bisect_right(self.matches, line), len(self.matches) - 1)
+
+        self.lblFind.setText(f'{i + 1} / {len(self.matches)}' + ('+' if len(self.matches) >= 10000 else ''))
+        self.goto(self.matches[i])
+
+    def on_tmrIndex_timeout(self):
+        self.scrLine.setMaximum(max(self.index.lines - 1, 0))
+        self.scrLine.setPageStep(self.rows())
+
+        if self.scrLine.value() + self.rows() >= self.index.lines and not self.index.done:
+            self.render()   # 索引到新行时，窗口未满则补上
+        else:
+            self.lblStat.setText(self.status())
+
+    def eventFilter(self, obj, event):
+        if obj is self.linFind:
+            if event.type() == QtCore.QEvent.KeyPress and event.key() in (Qt.Key_Return, Qt.Key_Enter):
+                self.find(bool(event.modifiers() & Qt.ShiftModifier))
+                return True
+
+            return super(LogView, self).eventFilter(obj, event)
+
+        if event.type() == QtCore.QEvent.Wheel:
+            self.scrLine.setValue(self.scrLine.value() - event.angleDelta().y() // 40)
+            return True
+
+        if event.type() == QtCore.QEvent.KeyPress:
+            key = event.key()
+            step = {Qt.Key_Up: -1, Qt.Key_Down: 1, Qt.Key_PageUp: -self.rows(), Qt.Key_PageDown: self.rows()}.get(key)
+            if step:
+                self.scrLine.setValue(self.scrLine.value() + step)
+                return True
+
+            if key in (Qt.Key_Home, Qt.Key_End) and event.modifiers() & Qt.ControlModifier:
+                self.goto(0 if key == Qt.Key_Home else self.index.lines)
+                return True
+
+        if event.type() == QtCore.QEvent.Resize and obj is self.txtMain.viewport():
+            QtCore.QTimer.singleShot(0, self.render)
+
+        return super(LogView, self).eventFilter(obj, event)
+
+    def closeEvent(self, evt):
+        self.tmrIndex.stop()
+        self.index.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='browse big RTT capture file or text log')
+    parser.add_argument('path')
+    parser.add_argument('-c', '--chnl', type=int, default=0, help='channel to show, for capture file')
+    parser.add_argument('--encoding', default='utf-8')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    view = LogView(args.path, args.chnl, args.encoding)
+    view.show()
+    app.exec()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#! python3
+'''
+Capture RTT from many probes at the same time, every probe is served by its own process.
+
+python rttmulti.py -a 0x20000000                     # all DAPLinks, tagged lines to stdout
+python rttmulti.py -p 0240000032044e45 -o {probe}_{chnl}.log
+'''
+import sys
+import time
+import queue
+import signal
+import multiprocessing
+
+import rtt
+
+
+def capture(probe, mode, speed, addr, elf, rcvq, stopped):
+    ''' worker process: capture one probe, put (kind, probe, chnl, data) into rcvq '''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # Ctrl-C 只由主进程处理，通过 stopped 通知各进程退出，各进程仍能送出统计
+
+    try:
+        RTTSym, RAMRegions = None, []
+        if elf:
+            Vars, RTTSym, RAMRegions = rtt.parse_elf(elf)
+
+        xlk = rtt.open_xlink(probe, mode, speed)
+        try:
+            engine = rtt.RTT(xlk, RTTSym=RTTSym, RAMRegions=RAMRegions)
+            engine.connect(addr)
+
+            rcvq.put(('info', probe, None, f'_SEGGER_RTT @ 0x{engine.RTTAddr:08X} with {engine.aUpNum} aUp and {engine.aDownNum} aDown'))
+
+            while not stopped.is_set():
+                for chnl, data in engine.aUpRead().items():
+                    rcvq.put(('data', probe, chnl, data))
+
+                if engine.sched.interval:
+                    stopped.wait(engine.sched.interval)
+
+            rcvq.put(('stats', probe, None, engine.sched.stats()))
+
+        finally:
+            xlk.close()
+
+    except Exception as e:
+        rcvq.put(('error', probe, None, str(e)))
+
+
+class MultiSession(object):
+    ''' open every probe in its own worker process, each with its own RTT engine '''
+    def __init__(self, probes, mode='arm', speed=4000, addr=0x20000000, elf=None):
+        self.rcvq = multiprocessing.Queue()
+        self.stopped = multiprocessing.Event()
+
+        self.procs = {probe: multiprocessing.Process(target=capture, args=(probe, mode, speed, addr, elf, self.rcvq, self.stopped), daemon=True)
+                      for probe in probes}
+
+    def start(self):
+        for proc in self.procs.values():
+            proc.start()
+
+    def stop(self, timeout=5):
+        ''' stop all workers, return messages they sent while stopping '''
+        self.stopped.set()
+
+        msgs = []
+        deadline = time.monotonic() + timeout
+        while self.alive() and time.monotonic() < deadline:
+            msgs.extend(self.recv())    # 队列中有数据的子进程要等数据被读走才能退出
+
+        for proc in self.procs.values():
+            proc.join(max(deadline - time.monotonic(), 0))
+
+        return msgs + self.recv(0)
+
+    def alive(self):
+        return any(proc.is_alive() for proc in self.procs.values())
+
+    def recv(self, timeout=0.1):
+        ''' return all messages available, wait at most timeout for the first one '''
+        msgs = []
+        try:
+            msgs.append(self.rcvq.get(timeout=timeout))
+            while True:
+                msgs.append(self.rcvq.get_nowait())
+        except queue.Empty:
+            pass
+
+        return msgs
+
+
+class Aggregator(object):
+    ''' write data of all probes to one stream, every line tagged with probe and channel '''
+    def __init__(self, file):
+        self.file = file
+        self.partial = {}   # {(probe, chnl): bytes}, line not ended yet
+
+    def write(self, probe, chnl, data):
+        data = self.partial.pop((probe, chnl), b'') + data
+
+        lines = data.split(b'\n')
+        if lines[-1]:
+            self.partial[(probe, chnl)] = lines[-1]
+
+        tag = f'[{probe}:{chnl}] '.encode()
+        self.file.write(b''.join(tag + line + b'\n' for line in lines[:-1]))
+
+    def flush(self):
+        for (probe, chnl), data in self.partial.items():
+            self.file.write(f'[{probe}:{chnl}] '.encode() + data + b'\n')
+        self.partial.clear()
+
+        self.file.flush()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SEGGER-RTT capture from many probes')
+    parser.add_argument('-p', '--probe', nargs='*', help='DAPLink unique IDs, all connected DAPLinks by default')
+    parser.add_argument('-m', '--mode', default='arm', choices=['arm', 'armj', 'rv', 'rvj'])
+    parser.add_argument('-s', '--speed', default=4000, type=int, help='KHz')
+    parser.add_argument('-a', '--addr', default='0x20000000', help='address to search _SEGGER_RTT from')
+    parser.add_argument('-e', '--elf', help='elf file to find _SEGGER_RTT symbol in')
+    parser.add_argument('-o', '--output', help='file path, "{probe}" and "{chnl}" in path are replaced; tagged lines to stdout by default')
+    args = parser.parse_args()
+
+    probes = args.probe or [daplink.unique_id for daplink in rtt.daplink_detect()]
+    if not probes:
+        parser.error('no probe found')
+
+    session = MultiSession(probes, args.mode, args.speed, int(args.addr, 16), args.elf)
+    session.start()
+
+    stdout = Aggregator(sys.stdout.buffer)
+    files = {}  # {path: file}
+
+    def handle(msgs):
+        for kind, probe, chnl, data in msgs:
+            if kind == 'data':
+                if args.output is None:
+                    stdout.write(probe, chnl, data)
+
+                else:
+                    path = args.output.format(probe=probe, chnl=chnl)
+                    if path not in files:
+                        files[path] = open(path, 'wb')
+                    files[path].write(data)
+
+            elif kind == 'stats':
+                print(f'{probe}: {data["polls/s"]:.0f} polls/s, {data["bytes/s"]:.0f} bytes/s, peak fill {data["fill_peak"]:.0%}', file=sys.stderr)
+
+            else:
+                print(f'{probe}: {data}', file=sys.stderr)
+
+    try:
+        while session.alive():
+            handle(session.recv())
+
+            sys.stdout.buffer.flush()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        handle(session.stop())    # 子进程退出前送出的数据和统计
+
+        if args.output is None:
+            stdout.flush()
+
+        for file in files.values():
+            file.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+'''
+RTT channel over TCP, like J-Link RTT Telnet Server on port 19021, one port for each channel.
+'''
+import socket
+import logging
+import selectors
+import threading
+
+from pyocd.utility.server import StreamServer
+from pyocd.utility.compatibility import to_bytes_safe
+
+LOG = logging.getLogger(__name__)
+
+
+class ChannelServer(StreamServer):
+    ''' StreamServer serving multiple clients at the same time
+
+        data written are sent to all clients, data received from any client are buffered for read().
+        every client has its own bounded send buffer, a slow client lose its oldest data, and never block write().
+    '''
+
+    MAX_PENDING = 1024 * 1024   # bytes buffered for one client
+
+    def __init__(self, port, serve_local_only=True, name=None, is_read_only=False):
+        self._clients = {}      # {socket: bytearray to send}
+        self._clients_lock = threading.Lock()
+
+        self._wakeup_r, self._wakeup_w = socket.socketpair()    # wake up server thread when there is data to send
+        self._wakeup_w.setblocking(False)
+
+        self.dropped = 0        # bytes dropped for slow clients
+
+        super(ChannelServer, self).__init__(port, serve_local_only, name, is_read_only)   # start server thread
+
+    def run(self):
+        LOG.info("%sserver started on port %d", self._formatted_name, self._port)
+
+        listener = self._abstract_socket.listener
+        listener.listen(8)
+        listener.setblocking(False)
+
+        sel = selectors.DefaultSelector()
+        sel.register(listener, selectors.EVENT_READ)
+        sel.register(self._wakeup_r, selectors.EVENT_READ)
+        try:
+            while not self._shutdown_event.is_set():
+                with self._clients_lock:
+                    for sock, pending in self._clients.items():
+                        sel.modify(sock, selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0))
+
+                for key, events in sel.select(0.1):
+                    sock = key.fileobj
+
+                    if sock is listener:
+                        conn, addr = listener.accept()
+                        conn.setblocking(False)
+                        sel.register(conn, selectors.EVENT_READ)
+                        with self._clients_lock:
+                            self._clients[conn] = bytearray()
+                        self.connected = True
+                        LOG.debug("%sclient %s connected", self._formatted_name, addr)
+
+                    elif sock is self._wakeup_r:
+                        sock.recv(4096)
+
+                    else:
+                        try:
+                            if events & selectors.EVENT_READ:
+                                data = sock.recv(4096)
+                                if len(data) == 0:
+                                    raise ConnectionError('client disconnected')
+
+                                if not self._is_read_only:
+                                    with self._buffer_lock:
+                                        self._buffer += data
+
+                            if events & selectors.EVENT_WRITE:
+                                with self._clients_lock:
+                                    pending = self._clients[sock]
+                                    count = sock.send(pending)
+                                    del pending[:count]
+
+                        except BlockingIOError:
+                            pass
+
+                        except OSError:
+                            sel.unregister(sock)
+                            sock.close()
+                            with self._clients_lock:
+                                self._clients.pop(sock)
+                                if not self._clients:
+                                    self.connected = None
+                            LOG.debug("%sclient disconnected", self._formatted_name)
+
+        finally:
+            with self._clients_lock:
+                for sock in self._clients:
+                    sock.close()
+                self._clients.clear()
+                self.connected = None
+
+            sel.close()
+            self._abstract_socket.cleanup()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
+
+        LOG.info("%sserver stopped", self._formatted_name)
+
+    def write(self, data):
+        ''' queue data for all clients, return at once '''
+        data = to_bytes_safe(data)
+
+        with self._clients_lock:
+            for pending in self._clients.values():
+                pending += data
+                if len(pending) > self.MAX_PENDING:
+                    self.dropped += len(pending) - self.MAX_PENDING
+                    del pending[:len(pending) - self.MAX_PENDING]
+
+            if not self._clients:
+                return len(data)
+
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            pass    # wake-up already pending, or server stopped
+
+        return len(data)
+
+    @property
+    def clients(self):
+        return len(self._clients)
@@ -0,0 +1,286 @@
+'''
+Simulated target, stands in for XLink so RTT, rtt.py and RTTView can be run, tested and benchmarked without hardware.
+
+RAM is a bytearray holding a _SEGGER_RTT control block, a firmware thread writes aUp channels (producers) and reads aDown
+channels (consumers) following SEGGER_RTT ring buffer rules, every probe access sleeps for the injected latency.
+
+python rtt.py -p sim -a 0x20000000
+python rtt.py -p sim:latency=0.0005,per_byte=0.000001,rate=200000,size=1024,mode=0 -a 0x20000000 -o -
+'''
+import math
+import time
+import struct
+import itertools
+import threading
+
+
+CB   = struct.Struct('<16sII')  # acID, MaxNumUpBuffers, MaxNumDownBuffers
+DESC = struct.Struct('<6I')     # sName, pBuffer, SizeOfBuffer, WrOff, RdOff, Flags
+
+MODE_NO_BLOCK_SKIP, MODE_NO_BLOCK_TRIM, MODE_BLOCK_IF_FIFO_FULL = 0, 1, 2
+
+
+def text_source():
+    ''' log lines, numbered, so lost and repeated lines can be found '''
+    for n in itertools.count():
+        yield f'{n:08d} t={time.monotonic():.6f} simulated log line\n'.encode()
+
+
+def wave_source(curves=2, period=100):
+    ''' records of wave text format, "sin cos," '''
+    for n in itertools.count():
+        yield (' '.join(f'{math.sin(2 * math.pi * (n / period + i / curves)) * 1000:.0f}' for i in range(curves)) + ',').encode()
+
+
+class SimTarget(object):
+    ''' XLink compatible simulated target
+
+        ups, downs: buffer size of every aUp and aDown channel
+        mode:       Flags of aUp channels, MODE_NO_BLOCK_SKIP, MODE_NO_BLOCK_TRIM or MODE_BLOCK_IF_FIFO_FULL
+        latency:    seconds every probe access takes, transfer() batch takes it once, like DAPLink deferred transfer
+        per_byte:   seconds every byte read or written takes, models probe bandwidth
+    '''
+
+    TICK = 0.001    # firmware thread period
+
+    def __init__(self, ram=0x20000000, size=0x10000, cb_offset=0x100, ups=(1024, 1024, 1024), downs=(16, 16, 16), mode=MODE_NO_BLOCK_SKIP,
+                 latency=0, per_byte=0):
+        self.ram = ram
+        self.mem = bytearray(size)
+        self.latency = latency
+        self.per_byte = per_byte
+
+        self.mode = 'arm'   # XLink mode
+        self.upMode = mode
+
+        self.RTTAddr = ram + cb_offset
+        self.aUpAddr = self.RTTAddr + CB.size
+        self.aDownAddr = self.aUpAddr + DESC.size * len(ups)
+
+        pBuffer = self.aDownAddr + DESC.size * len(downs)
+        for i, bufsize in enumerate(list(ups) + list(downs)):
+            DESC.pack_into(self.mem, self.aUpAddr - ram + DESC.size * i, 0, pBuffer, bufsize, 0, 0, mode if i < len(ups) else 0)
+            pBuffer += bufsize
+
+        if pBuffer > ram + size:
+            raise Exception('RTT buffers do not fit in simulated RAM')
+
+        CB.pack_into(self.mem, cb_offset, b'SEGGER RTT', len(ups), len(downs))   # 最后写 acID，与固件初始化顺序一致
+
+        self.lock = threading.Lock()    # firmware and probe access are each atomic, like bus transactions
+
+        self.producers = {}     # {chnl: [source, bytes/s, budget, pending]}
+        self.consumers = {}     # {chnl: [sink, bytes/s, budget]}
+
+        self.written  = [0] * len(ups)      # bytes written into aUp by firmware
+        self.dropped  = [0] * len(ups)      # bytes firmware dropped because aUp was full
+        self.consumed = [0] * len(downs)    # bytes read from aDown by firmware
+
+        self.accesses = 0   # probe accesses, a transfer() counts once
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def from_spec(cls, spec=''):
+        ''' target from "key=value,..." spec: latency, per_byte, size (aUp buffer size), mode, rate (chnl 0 bytes/s),
+            wave (chnl 1 records/s); aDown data are echoed to aUp of the same channel '''
+        args = {'latency': 0, 'per_byte': 0, 'size': 1024, 'mode': 0, 'rate': 10000, 'wave': 100}
+        for item in filter(None, spec.split(',')):
+            key, value = item.split('=')
+            if key not in args:
+                raise Exception(f'unknown simulated target option {key}')
+            args[key] = float(value)
+
+        target = cls(ups=[int(args['size'])] * 3, mode=int(args['mode']), latency=args['latency'], per_byte=args['per_byte'])
+        if args['rate']:
+            target.add_producer(0, text_source(), args['rate'])
+        if args['wave']:
+            target.add_producer(1, wave_source(), args['wave'] * 10)    # 每条记录约 10 字节
+        for chnl in range(len(target.consumed)):
+            target.add_consumer(chnl, lambda data, chnl=chnl: target.up_write(chnl, data))
+
+        target.start()
+
+        return target
+
+    # firmware side
+
+    def desc(self, addr):
+        return list(DESC.unpack_from(self.mem, addr - self.ram))
+
+    def up_write(self, chnl, data):
+        ''' SEGGER_RTT_Write(), return bytes written '''
+        addr = self.aUpAddr + DESC.size * chnl
+        with self.lock:
+            sName, pBuffer, size, WrOff, RdOff, Flags = self.desc(addr)
+
+            free = RdOff - WrOff - 1 if RdOff > WrOff else size - WrOff + RdOff - 1
+            count = len(data)
+            if count > free:
+                if Flags & 3 == MODE_NO_BLOCK_SKIP:
+                    count = 0   # 放不下就整段丢弃
+                else:
+                    count = free
+
+            first = min(count, size - WrOff)
+            self.mem[pBuffer - self.ram + WrOff:pBuffer - self.ram + WrOff + first] = data[:first]
+            self.mem[pBuffer - self.ram:pBuffer - self.ram + count - first] = data[first:count]
+
+            struct.pack_into('<I', self.mem, addr - self.ram + 12, (WrOff + count) % size)    # 数据写完才更新 WrOff
+
+            self.written[chnl] += count
+            if Flags & 3 != MODE_BLOCK_IF_FIFO_FULL:
+                self.dropped[chnl] += len(data) - count
+
+        return count
+
+    def down_read(self, chnl, count):
+        ''' SEGGER_RTT_Read(), return at most count bytes '''
+        addr = self.aDownAddr + DESC.size * chnl
+        with self.lock:
+            sName, pBuffer, size, WrOff, RdOff, Flags = self.desc(addr)
+
+            count = min(count, WrOff - RdOff if WrOff >= RdOff else size - RdOff + WrOff)
+
+            first = min(count, size - RdOff)
+            data = bytes(self.mem[pBuffer - self.ram + RdOff:pBuffer - self.ram + RdOff + first] + self.mem[pBuffer - self.ram:pBuffer - self.ram + count - first])
+
+            struct.pack_into('<I', self.mem, addr - self.ram + 16, (RdOff + count) % size)
+
+            self.consumed[chnl] += count
+
+        return data
+
+    def add_producer(self, chnl, source, rate):
+        ''' write data from iterator source into aUp chnl at rate bytes/s '''
+        self.producers[chnl] = [iter(source), rate, 0, b'']
+
+    def add_consumer(self, chnl, sink, rate=0):
+        ''' read aDown chnl at rate bytes/s (0: as fast as data come), give data to sink() '''
+        self.consumers[chnl] = [sink, rate, 0]
+
+    def step(self, dt):
+        ''' run firmware for dt seconds '''
+        for chnl, prod in self.producers.items():
+            source, rate, budget, pending = prod
+            budget = min(budget + rate * dt, rate)  # 积压最多 1 秒
+
+            while budget > 0:
+                if not pending:
+                    pending = next(source, b'')     # 每项一次 SEGGER_RTT_Write()
+                    if not pending:
+                        break
+
+                count = self.up_write(chnl, pending)
+
+                if self.upMode == MODE_BLOCK_IF_FIFO_FULL:
+                    budget -= count
+                    pending = pending[count:]
+                    if pending:
+                        break   # aUp 满了，剩下的数据留到下次写
+
+                else:
+                    budget -= len(pending)
+                    pending = b''
+
+            prod[2:] = [budget, pending]
+
+        for chnl, cons in self.consumers.items():
+            sink, rate, budget = cons
+            budget = min(budget + rate * dt, rate) if rate else 1 << 30
+
+            data = self.down_read(chnl, int(budget))
+            if data:
+                sink(data)
+
+            cons[2] = budget - len(data)
+
+    def run(self):
+        last = time.monotonic()
+        while not self.stopped.wait(self.TICK):
+            now = time.monotonic()
+            self.step(now - last)
+            last = now
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+
+    # probe side, same methods as XLink
+
+    def access(self, count):
+        self.accesses += 1
+
+        delay = self.latency + self.per_byte * count
+        if delay:
+            time.sleep(delay)
+
+    def read(self, addr, count):
+        ''' memory outside RAM reads as 0 '''
+        start = addr - self.ram
+        data = bytes(self.mem[max(start, 0):max(start + count, 0)])
+        if start < 0:
+            data = bytes(min(-start, count)) + data
+        return data + bytes(count - len(data))
+
+    def write(self, addr, data):
+        start = addr - self.ram
+        if start < 0 or start + len(data) > len(self.mem):
+            raise Exception(f'write to 0x{addr:08X} out of simulated RAM')
+        self.mem[start:start + len(data)] = data
+
+    def read_mem_U8(self, addr, count):
+        self.access(count)
+        with self.lock:
+            return list(self.read(addr, count))
+
+    def read_mem_U32(self, addr, count):
+        self.access(count * 4)
+        with self.lock:
+            return list(struct.unpack(f'<{count}I', self.read(addr, count * 4)))
+
+    def read_U32(self, addr):
+        return self.read_mem_U32(addr, 1)[0]
+
+    def write_mem_U8(self, addr, data):
+        self.access(len(data))
+        with self.lock:
+            self.write(addr, bytes(data))
+
+    def write_U8(self, addr, val):
+        self.write_mem_U8(addr, struct.pack('<B', val))
+
+    def write_U16(self, addr, val):
+        self.write_mem_U8(addr, struct.pack('<H', val))
+
+    def write_U32(self, addr, val):
+        self.write_mem_U8(addr, struct.pack('<I', val))
+
+    def transfer(self, ops):
+        ''' same as XLink.transfer(), the whole batch takes one latency '''
+        self.access(sum(arg if op == 'r' else 4 for op, addr, arg in ops))
+
+        res = []
+        with self.lock:
+            for op, addr, arg in ops:
+                if op == 'r':
+                    res.append(list(self.read(addr, arg)))
+                else:
+                    self.write(addr, struct.pack('<I', arg))
+
+        return res
+
+    def read_core_type(self):
+        return 'Cortex-M4'
+
+    def unique_id(self):
+        return 'SIM'
+
+    def close(self):
+        self.stop()
@@ -0,0 +1,163 @@
+'''
+RTT engine against simtarget.SimTarget, no probe needed
+
+python -m pytest test_simtarget.py
+'''
+import os
+import struct
+import binascii
+
+import numpy as np
+import pytest
+
+import rtt
+import waveform
+from simtarget import SimTarget, MODE_NO_BLOCK_SKIP, MODE_BLOCK_IF_FIFO_FULL
+
+
+def connect(target, tmp_path):
+    engine = rtt.RTT(target, cache=rtt.RTTCache(str(tmp_path / 'rttcache.ini')))
+    engine.connect(target.ram)
+    return engine
+
+
+def poll(engine):
+    engine.aUpDesc = None   # 不用上次轮询预读的描述符，测试中固件写入与轮询之间没有时间间隔
+    return engine.aUpRead()
+
+
+@pytest.fixture
+def target():
+    target = SimTarget(ups=(256, 256, 256), downs=(16, 16, 16))   # 不启动固件线程，由测试调用 up_write() 和 step()
+    yield target
+    target.close()
+
+
+def test_connect(target, tmp_path):
+    engine = connect(target, tmp_path)
+
+    assert engine.RTTAddr == target.RTTAddr
+    assert (engine.aUpNum, engine.aDownNum) == (3, 3)
+
+
+def test_wrapped_read(target, tmp_path):
+    engine = connect(target, tmp_path)
+
+    first = bytes(range(200))
+    target.up_write(0, first)
+    assert poll(engine) == {0: first}
+
+    second = bytes(range(150, 0, -1))
+    target.up_write(0, second)
+    sName, pBuffer, size, WrOff, RdOff, Flags = target.desc(target.aUpAddr)
+    assert WrOff < RdOff    # 数据跨越缓冲区末尾
+
+    assert poll(engine) == {0: second}
+    assert poll(engine) == {}
+
+
+def test_multi_channel(target, tmp_path):
+    engine = connect(target, tmp_path)
+
+    for chnl in range(3):
+        target.up_write(chnl, f'chnl {chnl}\n'.encode())
+
+    accesses = target.accesses
+    assert poll(engine) == {chnl: f'chnl {chnl}\n'.encode() for chnl in range(3)}
+    assert target.accesses - accesses == 2  # 描述符一次，所有通道的数据和 RdOff 回写一批
+
+
+def test_drops_skip(target, tmp_path):
+    engine = connect(target, tmp_path)
+
+    target.up_write(0, bytes(250))
+    assert target.up_write(0, bytes(10)) == 0   # 放不下，整段丢弃
+    assert target.dropped[0] == 10
+
+    poll(engine)
+    stats = engine.stats()[0]
+    assert stats['mode'] == 'NO_BLOCK_SKIP'
+    assert stats['fulls'] == 1 and stats['drops'] == 1
+
+    target.up_write(0, bytes(10))
+    poll(engine)
+    assert engine.stats()[0]['drops'] == 1
+
+
+def test_drops_block(tmp_path):
+    target = SimTarget(ups=(256,), downs=(16,), mode=MODE_BLOCK_IF_FIFO_FULL)
+    engine = connect(target, tmp_path)
+
+    assert target.up_write(0, bytes(300)) == 255
+    poll(engine)
+
+    stats = engine.stats()[0]
+    assert stats['fulls'] == 1 and stats['drops'] == 0  # 阻塞模式下满了只是等待，不丢数据
+    assert target.dropped[0] == 0
+
+
+def test_drops_reset(target, tmp_path):
+    engine = connect(target, tmp_path)
+
+    target.up_write(0, bytes(100))
+    poll(engine)
+
+    struct.pack_into('<I', target.mem, target.aUpAddr - target.ram + 16, 0)    # 目标复位了缓冲区
+    struct.pack_into('<I', target.mem, target.aUpAddr - target.ram + 12, 0)
+    poll(engine)
+
+    assert engine.stats()[0]['resets'] == 1
+
+
+def test_upload_echo(target, tmp_path):
+    engine = connect(target, tmp_path)
+    target.add_consumer(1, lambda data: target.up_write(1, data))
+
+    path = tmp_path / 'upload.bin'
+    path.write_bytes(os.urandom(5000))
+
+    writer = rtt.DownWriter(engine.aDownWrite)
+    writer.send_file(1, str(path))
+
+    echo = b''
+    for i in range(10000):
+        writer.feed()
+        target.step(0)
+        echo += poll(engine).get(1, b'')
+
+        if not writer.busy() and len(echo) == 5000:
+            break
+
+    assert echo == path.read_bytes()
+
+
+def test_upload_unconfigured(tmp_path):
+    target = SimTarget(ups=(256,), downs=(16, 0))
+    engine = connect(target, tmp_path)
+
+    writer = rtt.DownWriter(engine.aDownWrite)
+    writer.send(1, b'hello')
+    writer.feed()
+
+    assert not writer.busy()
+
+
+def frame(a, b, crc=None):
+    payload = struct.pack('<hh', a, b)
+    return b'\xAA\x55' + payload + struct.pack('<H', binascii.crc_hqx(payload, 0xFFFF) if crc is None else crc)
+
+
+def test_frame_decoder(target, tmp_path):
+    engine = connect(target, tmp_path)
+    decoder = waveform.FrameDecoder('<hh', b'\xAA\x55', 'crc16')
+
+    good = [(i, -i) for i in range(40)]
+    data = b''.join(frame(a, b) for a, b in good[:20]) + frame(7, 7, crc=0) + b'\x01\x02\x03' + b''.join(frame(a, b) for a, b in good[20:])
+
+    rows = []
+    for i in range(0, len(data), 100):  # 分段写入，记录跨越读取边界和缓冲区末尾
+        target.up_write(0, data[i:i+100])
+        rows.append(decoder.decode(poll(engine)[0]))
+
+    assert np.concatenate(rows).tolist() == [[a, b] for a, b in good]
+    assert decoder.errors == 2  # 一条 CRC 错误，一次失去同步
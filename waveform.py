@@ -0,0 +1,256 @@
+'''
+wave data: decode samples from aUp byte stream for the wave view.
+
+text mode:   "11 22, 33 44," one record each comma, fields separated by space
+binary mode: fixed layout records declared by struct format, e.g. "<hhf", optionally with sync word and CRC
+'''
+import re
+import zlib
+import struct
+import binascii
+
+import numpy as np
+
+
+def parse_text(buff, hex=False):
+    ''' parse records from text, return (samples, rest of buff), samples[i] is list of fields of record i '''
+    end = buff.rfind(b',')
+    if end < 0:
+        return [], buff
+
+    if not hex:
+        d = [[float(x)   for x in X.split()] for X in buff[:end].split(b',')]  # [[12], [34]]   or [[12, 34], [56, 78]]
+    else:
+        d = [[int(x, 16) for x in X.split()] for X in buff[:end].split(b',')]  # for example, d = [b'12', b'AA', b'5A5A']
+
+    return [arr for arr in d if arr], buff[end+1:]
+
+
+def struct_dtype(fmt):
+    ''' numpy dtype of struct format, None if not supported (native alignment, strings, ...) '''
+    if not fmt or fmt[0] not in '<>!=':
+        return None     # 本机对齐方式下字段间可能有填充，交给 struct 处理
+
+    order = '>' if fmt[0] in '>!' else '<'
+
+    fields = []
+    for count, char in re.findall(r'(\d*)([a-zA-Z?])', fmt[1:]):
+        count = int(count) if count else 1
+
+        if char == 'x':
+            fields.append((f'pad{len(fields)}', f'V{count}'))
+
+        elif char in FrameDecoder.TYPES:
+            for i in range(count):
+                fields.append((f'f{len(fields)}', order + FrameDecoder.TYPES[char]))
+
+        else:
+            return None
+
+    dtype = np.dtype(fields)
+    if dtype.itemsize != struct.calcsize(fmt):
+        return None
+
+    return dtype
+
+
+class FrameDecoder(object):
+    ''' decode binary records from byte stream in bulk
+
+        fmt:  struct format of record payload, e.g. '<hhf'
+        sync: bytes before every record, used to find record boundary again after data lost
+        crc:  None, 'sum8', 'crc16' (CCITT, init 0xFFFF) or 'crc32', after payload, covers payload only, same byte order as fmt
+    '''
+
+    TYPES = {'b': 'i1', 'B': 'u1', 'h': 'i2', 'H': 'u2', 'i': 'i4', 'I': 'u4', 'l': 'i4', 'L': 'u4',
+             'q': 'i8', 'Q': 'u8', 'e': 'f2', 'f': 'f4', 'd': 'f8', '?': 'b1'}
+
+    CRC_SIZE = {None: 0, 'sum8': 1, 'crc16': 2, 'crc32': 4}
+
+    def __init__(self, fmt, sync=b'', crc=None):
+        if crc not in self.CRC_SIZE:
+            raise Exception(f'unknown CRC {crc}')
+
+        self.struct = struct.Struct(fmt)
+        self.dtype  = struct_dtype(fmt)
+        self.sync = sync
+        self.crc  = crc
+
+        self.size = len(sync) + self.struct.size + self.CRC_SIZE[crc]
+
+        self.buff = b''
+        self.errors = 0     # records dropped, because of bad CRC or lost sync
+
+    def decode(self, data):
+        ''' decode all complete records in buffered data, return float array of shape (records, fields) '''
+        buff = self.buff + data
+
+        recs = []   # [uint8 array of shape (n, size)]
+        pos = 0
+        while len(buff) - pos >= self.size:
+            n = (len(buff) - pos) // self.size
+            rows = np.frombuffer(buff, np.uint8, n * self.size, pos).reshape(n, self.size)
+
+            if self.sync:
+                ok = (rows[:, :len(self.sync)] == np.frombuffer(self.sync, np.uint8)).all(axis=1)
+                n = int(ok.argmin()) if not ok.all() else n     # records before first sync mismatch
+                rows = rows[:n]
+
+            recs.append(rows)
+            pos += n * self.size
+
+            if len(buff) - pos >= self.size:    # sync lost, search for next sync word
+                self.errors += 1
+
+                pos = buff.find(self.sync, pos + 1)
+                if pos < 0:
+                    pos = len(buff) - len(self.sync) + 1
+                    break
+
+        self.buff = buff[pos:]
+
+        if not recs:
+            return np.empty((0, self.fields()))
+
+        rows = np.concatenate(recs)
+        payload = rows[:, len(self.sync):len(self.sync) + self.struct.size]
+
+        if self.crc:
+            ok = self.check(payload, rows[:, len(self.sync) + self.struct.size:])
+            self.errors += int(len(ok) - ok.sum())
+            payload = payload[ok]
+
+        payload = np.ascontiguousarray(payload).tobytes()
+
+        if self.dtype is not None:
+            arr = np.frombuffer(payload, self.dtype)
+            return np.column_stack([arr[name].astype(float) for name in self.dtype.names if not name.startswith('pad')]) if len(arr) else np.empty((0, self.fields()))
+
+        else:
+            return np.array(list(self.struct.iter_unpack(payload)), dtype=float).reshape(-1, self.fields())
+
+    def check(self, payload, crcs):
+        ''' return bool array, True for records whose CRC is right '''
+        order = '>' if self.struct.format[:1] in ('>', '!') else '<'
+
+        crcs = np.ascontiguousarray(crcs).view(f'{order}u{crcs.shape[1]}').ravel()
+
+        if self.crc == 'sum8':
+            calc = payload.sum(axis=1, dtype=np.uint32) & 0xFF
+
+        elif self.crc == 'crc16':
+            calc = np.array([binascii.crc_hqx(bytes(x), 0xFFFF) for x in payload])
+
+        else:
+            calc = np.array([zlib.crc32(bytes(x)) for x in payload])
+
+        return calc == crcs
+
+    def fields(self):
+        return len(self.struct.unpack(bytes(self.struct.size)))
+
+    def reset(self):
+        self.buff = b''
+
+
+class SampleRing(object):
+    ''' fixed-size sample store of all curves, newest npoint samples kept
+
+        every sample is written twice, at i and i + npoint, so the latest npoint samples are always one contiguous slice,
+        append is O(1) per sample and reading needs no copy
+    '''
+    def __init__(self, ncurve, npoint):
+        self.ncurve = ncurve
+        self.npoint = npoint
+
+        self.data = np.zeros((ncurve, npoint * 2))
+        self.head = 0       # index of oldest sample
+
+        self.version = 0    # changed every extend, tell Decimator data changed
+
+    def extend(self, d):
+        ''' append records, d[i] is fields of record i, field j goes to curve j, missing fields hold last value '''
+        if isinstance(d, np.ndarray):
+            d = d[-self.npoint:, :self.ncurve]
+            missing = np.zeros((len(d), self.ncurve), bool)
+            missing[:, d.shape[1]:] = True
+            d = np.pad(d, ((0, 0), (0, self.ncurve - d.shape[1])))
+
+        else:
+            d = d[-self.npoint:]
+            missing = np.array([[j >= len(arr) for j in range(self.ncurve)] for arr in d])
+            d = np.array([list(arr[:self.ncurve]) + [0] * (self.ncurve - len(arr[:self.ncurve])) for arr in d], dtype=float)
+
+        if missing.any():   # 取同一曲线上一个样本的值
+            last = self.data[:, (self.head - 1) % self.npoint + self.npoint]
+            d = np.vstack([last, d])
+            missing = np.vstack([np.zeros(self.ncurve, bool), missing])
+
+            rows = np.where(missing, 0, np.arange(len(d))[:, None])
+            rows = np.maximum.accumulate(rows, axis=0)
+            d = d[rows, np.arange(self.ncurve)][1:]
+
+        n = len(d)
+
+        idx = (self.head + np.arange(n)) % self.npoint
+        self.data[:, idx] = d.T
+        self.data[:, idx + self.npoint] = d.T
+
+        self.head = (self.head + n) % self.npoint
+
+        self.version += 1
+
+    def values(self, n=None):
+        ''' samples of first n curves, oldest first, shape (n, npoint) '''
+        return self.data[:n, self.head:self.head + self.npoint]
+
+    def min(self, n=None):
+        return self.values(n).min()
+
+    def max(self, n=None):
+        return self.values(n).max()
+
+
+class Decimator(object):
+    ''' reduce samples to min and max of every pixel column, so points drawn are tied to widget width, and spikes stay visible
+
+        result is cached, recomputed only when data, curve number, width or visible range changes
+    '''
+    def __init__(self):
+        self.key = None
+        self.xs = self.ys = None
+
+    def decimate(self, ring, n, width, lo=0, hi=None):
+        ''' return (xs, ys) of first n curves in samples [lo, hi), both of shape (n, points) '''
+        hi = ring.npoint if hi is None else hi
+        lo, hi = max(0, min(lo, hi - 1)), min(hi, ring.npoint)
+        width = max(int(width), 1)
+
+        key = (ring.version, n, width, lo, hi)
+        if key != self.key:
+            self.key = key
+            self.xs, self.ys = minmax(ring.values(n)[:, lo:hi], width)
+            self.xs += lo
+
+        return self.xs, self.ys
+
+
+def minmax(y, width):
+    ''' y: shape (curves, samples); split samples into width bins, keep min and max of every bin in time order
+        return (xs, ys), at most 2 * width points each curve '''
+    n, count = y.shape
+    if count <= width * 2:
+        return np.tile(np.arange(count, dtype=float), (n, 1)), y.copy()
+
+    k = -(-count // width)      # samples each bin
+    width = -(-count // k)
+    y = np.pad(y, ((0, 0), (0, width * k - count)), mode='edge').reshape(n, width, k)
+
+    imin, imax = y.argmin(axis=2), y.argmax(axis=2)
+    idx = np.stack([np.minimum(imin, imax), np.maximum(imin, imax)], axis=2)   # 先出现的在前，保持波形走向
+
+    ys = np.take_along_axis(y, idx, axis=2).reshape(n, -1)
+    xs = (idx + np.arange(width)[None, :, None] * k).reshape(n, -1).astype(float)
+    np.minimum(xs, count - 1, out=xs)
+
+    return xs, ys
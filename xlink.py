@@ -1,6 +1,7 @@
 import os
 import time
 import ctypes
+import struct
 import operator
 
 
@@ -137,6 +138,68 @@ class XLink(object):
         else:
             return self.xlk.read32(addr)
 
+    def transfer(self, ops):
+        ''' perform a batch of memory accesses in order
+            ops: [('r', addr, count), ('w', addr, val)], 'r' read count bytes, 'w' write a 32-bit word
+            return: list of data read by 'r' ops
+            DAPLink queue all accesses with deferred transfer, so the batch cost about one USB round-trip '''
+        if isinstance(self.xlk, (jlink.JLink, openocd.OpenOCD)):
+            res = []
+            for op, addr, arg in ops:
+                if op == 'r':
+                    res.append(self.read_mem_U8(addr, arg))
+                else:
+                    self.write_U32(addr, arg)
+
+            return res
+
+        else:
+            cbs = []
+            for op, addr, arg in ops:
+                if op == 'r':
+                    cbs.append(self._read_mem_U8_deferred(addr, arg))
+                else:
+                    self.xlk.ap.write_memory(addr, arg, 32)     # write is queued, sent together with following reads
+
+            return [cb() for cb in cbs]
+
+    def _read_mem_U8_deferred(self, addr, count):
+        ''' queue a block read on DAPLink, return a callback that get the data '''
+        from pyocd.coresight.ap import MEM_AP_CSW, MEM_AP_TAR, MEM_AP_DRW, CSW_VALUE, CSW_SIZE32, APSEL_SHIFT
+
+        ap = self.xlk.ap
+
+        cbs = []    # [(width, callback)]
+        while count and (addr & 3):
+            cbs.append((1, ap.read_memory(addr, 8, now=False)))
+            addr, count = addr + 1, count - 1
+
+        while count >= 4:
+            n = ap.auto_increment_page_size - (addr & (ap.auto_increment_page_size - 1))    # transaction must not cross auto-increment boundary
+            n = min(n, count & ~3)
+
+            ap.write_reg(MEM_AP_CSW, CSW_VALUE | CSW_SIZE32)
+            ap.write_reg(MEM_AP_TAR, addr)
+            cbs.append((4, ap.link.read_ap_multiple((ap.ap_num << APSEL_SHIFT) | MEM_AP_DRW, n // 4, now=False)))
+            addr, count = addr + n, count - n
+
+        while count:
+            cbs.append((1, ap.read_memory(addr, 8, now=False)))
+            addr, count = addr + 1, count - 1
+
+        def read_cb():
+            data = []
+            for width, cb in cbs:
+                if width == 1:
+                    data.append(cb())
+                else:
+                    words = cb()
+                    data.extend(struct.pack(f'<{len(words)}I', *words))
+
+            return data
+
+        return read_cb
+
     def read_reg(self, reg):
         if isinstance(self.xlk, (jlink.JLink, openocd.OpenOCD)):
             return self.xlk.read_reg(reg.lower())
@@ -187,6 +250,14 @@ class XLink(object):
         else:
             self.xlk.ap.dp.link.close()
 
+    def unique_id(self):
+        if isinstance(self.xlk, jlink.JLink):
+            return f'JLink {self.xlk.serial_number()}'
+        elif isinstance(self.xlk, openocd.OpenOCD):
+            return f'OpenOCD {self.xlk.host}:{self.xlk.port}'
+        else:
+            return f'DAPLink {self.xlk.ap.dp.link.unique_id}'
+
     CORE_TYPE_NAME = {
         0xC20: "Cortex-M0",
         0xC21: "Cortex-M1",